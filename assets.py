@@ -0,0 +1,111 @@
+# assets.py
+
+import hashlib
+import logging
+import re
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+
+import streamlit as st
+
+from tracing import Tracer
+
+logger = logging.getLogger(__name__)
+
+_COMMENT_RE = re.compile(r"/\*.*?\*/", re.S)
+_STYLE_TAG_RE = re.compile(r"^\s*<style[^>]*>|</style>\s*$", re.I)
+_SPACE_RE = re.compile(r"\s+")
+_PUNCT_RE = re.compile(r"\s*([{};,>])\s*")
+
+
+def minify_css(css: str) -> str:
+    """Strip comments and redundant whitespace from a CSS block."""
+    css = _STYLE_TAG_RE.sub("", css)
+    css = _COMMENT_RE.sub("", css)
+    css = _SPACE_RE.sub(" ", css)
+    css = _PUNCT_RE.sub(r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return css.replace(";}", "}").strip()
+
+
+@dataclass(frozen=True)
+class StyleAsset:
+    name: str
+    css: str
+    fingerprint: str
+
+    @property
+    def filename(self) -> str:
+        return f"{self.name}.{self.fingerprint}.css"
+
+
+class AssetPipeline:
+    """Builds each injected style block once per process.
+
+    Blocks are minified and fingerprinted by content. When Streamlit static
+    file serving is enabled (``server.enableStaticServing``) the CSS is
+    written to ``static/<name>.<hash>.css`` and a rerun only sends a short
+    ``<link>`` tag, so the browser downloads the stylesheet once per session.
+    Otherwise the minified block is inlined. (Streamlit releases that serve
+    ``.css`` as text/plain should leave static serving off.)
+
+    Streamlit drops any element a rerun does not emit again, so the tag
+    itself still has to be sent on every rerun.
+    """
+    STATIC_DIR = Path(__file__).resolve().parent / "static"
+    STATIC_URL = "app/static"
+
+    _assets = {}
+    _published = set()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def build(name: str, css: str) -> StyleAsset:
+        """Minify and fingerprint a style block (cached per name and content)."""
+        key = (name, css)
+        asset = AssetPipeline._assets.get(key)
+        if asset is None:
+            minified = minify_css(css)
+            fingerprint = hashlib.sha1(minified.encode("utf-8")).hexdigest()[:12]
+            asset = StyleAsset(name, minified, fingerprint)
+            with AssetPipeline._lock:
+                AssetPipeline._assets[key] = asset
+        return asset
+
+    @staticmethod
+    def inject_css(name: str, css: str):
+        """Emit a style block as a cached stylesheet link, or inline if unavailable."""
+        with Tracer.span(f"inject_css:{name}", cat="css"):
+            asset = AssetPipeline.build(name, css)
+            if AssetPipeline._publish(asset):
+                st.markdown(
+                    f'<link rel="stylesheet" href="{AssetPipeline.STATIC_URL}/{asset.filename}">',
+                    unsafe_allow_html=True
+                )
+            else:
+                st.markdown(f"<style>{asset.css}</style>", unsafe_allow_html=True)
+
+    @staticmethod
+    def _publish(asset: StyleAsset) -> bool:
+        if asset.filename in AssetPipeline._published:
+            return True
+        try:
+            if not st.get_option("server.enableStaticServing"):
+                return False
+        except Exception:
+            return False
+
+        with AssetPipeline._lock:
+            if asset.filename in AssetPipeline._published:
+                return True
+            try:
+                AssetPipeline.STATIC_DIR.mkdir(exist_ok=True)
+                path = AssetPipeline.STATIC_DIR / asset.filename
+                if not path.exists():
+                    path.write_text(asset.css, encoding="utf-8")
+            except OSError:
+                logger.warning("Cannot write %s; inlining styles instead.", asset.filename)
+                return False
+            AssetPipeline._published.add(asset.filename)
+        return True
@@ -0,0 +1,352 @@
+# bench.py
+"""Micro-benchmarks for the hot paths, on synthetic data (no database needed).
+
+    python bench.py                      # run and compare with bench_baseline.json
+    python bench.py --sizes 1000,100000  # smaller run
+    python bench.py --update-baseline    # accept the current numbers
+
+Results are written as JSON (``--output``). Each timing is the best of
+``--repeat`` runs; a case regresses when it is slower than the baseline by
+more than ``--tolerance``. The exit status is 1 on any regression.
+
+Timings depend on the machine, so no baseline ships with the repo: the
+first run on a machine (no ``--baseline`` file yet) stores its numbers as
+the baseline and compares nothing. Run it once on the commit you want to
+measure against.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import random
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+DEFAULT_BASELINE = ROOT / "bench_baseline.json"
+DEFAULT_OUTPUT = ROOT / "bench_results.json"
+SEED = 20240601
+
+# Per-row paths (lookups, validation) are timed on a fixed sample so their
+# cost per call is comparable across table sizes
+SAMPLE = 10_000
+
+# Differences below this are timer noise, whatever the tolerance says
+NOISE_FLOOR = 0.0005
+
+# Modules `import main` must not pull in (page modules load lazily)
+LAZY_MODULES = ("landing", "login", "signup", "dashboard", "medicines",
+                "orders", "cart", "consult", "numpy")
+
+NAMES = ["Paracetamol", "Ibuprofen", "Amoxicillin", "Cetirizine", "Omeprazole",
+         "Metformin", "Atorvastatin", "Azithromycin", "Loratadine", "Aspirin",
+         "Diclofenac", "Ranitidine", "Salbutamol", "Vitamin C", "Zinc"]
+FORMS = ["Tablets", "Capsules", "Syrup", "Drops", "Cream", "Injection"]
+STRENGTHS = ["50mg", "100mg", "250mg", "500mg", "650mg", "1g"]
+CATEGORIES = ["Pain Relief", "Antibiotics", "Allergy", "Digestive", "Diabetes",
+              "Cardiac", "Respiratory", "Vitamins"]
+MAKERS = ["Cipla", "Sun Pharma", "Pfizer", "GSK", "Abbott", "Dr. Reddy's"]
+
+# -------------------------------
+# 🧪 Synthetic Data
+# -------------------------------
+def make_medicines(n, rng):
+    today = date.today()
+    rows = []
+    for i in range(1, n + 1):
+        name = rng.choice(NAMES)
+        rows.append({
+            "id": i,
+            "name": f"{name} {rng.choice(STRENGTHS)} {rng.choice(FORMS)}",
+            "description": f"{name} for everyday use. Store below 25C.",
+            "category": rng.choice(CATEGORIES),
+            "price": round(rng.uniform(1, 500), 2),
+            "stock": rng.choice((0, rng.randint(1, 500))),
+            "expiry_date": None if rng.random() < 0.02
+            else today + timedelta(days=rng.randint(-365, 3 * 365)),
+            "manufacturer": rng.choice(MAKERS),
+            "requires_prescription": int(rng.random() < 0.3),
+        })
+    return rows
+
+
+def make_users(n, rng):
+    return [{
+        "id": i,
+        "username": f"user{i}",
+        "email": f"user{i}@example.com",
+        "password": f"Secret{i}!",
+        "role": "user",
+        "status": "inactive" if rng.random() < 0.01 else "active",
+    } for i in range(1, n + 1)]
+
+
+def make_logins(users, rng):
+    """Sample (login, password) pairs: hits, email logins, bad passwords, unknown users."""
+    logins = []
+    for _ in range(SAMPLE):
+        user = rng.choice(users)
+        roll = rng.random()
+        if roll < 0.7:
+            logins.append((user["username"], user["password"]))
+        elif roll < 0.8:
+            logins.append((user["email"].upper(), user["password"]))
+        elif roll < 0.9:
+            logins.append((user["username"], "wrong"))
+        else:
+            logins.append((f"ghost{rng.randint(1, 10**9)}", "wrong"))
+    return logins
+
+
+def make_credentials(rng):
+    emails = [rng.choice((f"user{i}@example.com", f"user{i}@example", f"user {i}@mail.co.uk"))
+              for i in range(SAMPLE)]
+    passwords = [rng.choice((f"Secret{i}!", f"secret{i}", f"SECRET{i}!", "Ab1!", f"Secretpass{i}"))
+                 for i in range(SAMPLE)]
+    return emails, passwords
+
+# -------------------------------
+# 🔌 Stand-ins for the Database
+# -------------------------------
+@contextmanager
+def patched(obj, name, value):
+    original = obj.__dict__[name]
+    setattr(obj, name, value)
+    try:
+        yield
+    finally:
+        setattr(obj, name, original)
+
+
+@contextmanager
+def synthetic_catalog(rows):
+    """Serve ``rows`` as the medicines table and keep one snapshot for the run."""
+    from utils import Catalog, DBHelper
+
+    def fetch_all(query, params=None, primary=False):
+        return rows
+
+    with patched(DBHelper, "fetch_all", staticmethod(fetch_all)), \
+            patched(Catalog, "TTL", float("inf")):
+        Catalog.invalidate()
+        Catalog._last = None
+        try:
+            yield Catalog
+        finally:
+            Catalog.invalidate()
+            Catalog._last = None
+
+
+@contextmanager
+def synthetic_users(users):
+    """Answer ``User.find_by_login`` from memory, keyed like the unique indexes."""
+    from utils import User
+
+    by_login = {}
+    for user in users:
+        by_login.setdefault(user["email"].lower(), user)
+        by_login[user["username"].lower()] = user
+
+    def find_by_login(identifier):
+        identifier = User.normalize(identifier)
+        return by_login.get(identifier) if identifier else None
+
+    with patched(User, "find_by_login", staticmethod(find_by_login)):
+        yield
+
+# -------------------------------
+# ⏱️ Timing
+# -------------------------------
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure_import(repeat):
+    """Time `import main` in fresh interpreters and list eagerly loaded page modules."""
+    probe = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        "import main\n"
+        "elapsed = time.perf_counter() - start\n"
+        f"eager = [m for m in {LAZY_MODULES!r} if m in sys.modules]\n"
+        "print(json.dumps({'seconds': elapsed, 'eager': eager}))\n"
+    )
+    best, eager = float("inf"), []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, check=True,
+                             capture_output=True, text=True).stdout
+        sample = json.loads(out.strip().splitlines()[-1])
+        best, eager = min(best, sample["seconds"]), sample["eager"]
+    return best, eager
+
+
+def bench_size(n, repeat):
+    """Run every case against a synthetic catalog and user table of ``n`` rows."""
+    from cart import Cart, CartPage, CartUtils
+    from login import LoginPage
+    from medicines import MedicineManager, MedicineQuery
+    from utils import Validator
+
+    rng = random.Random(SEED + n)
+    rows = make_medicines(n, rng)
+    users = make_users(n, rng)
+    sample = rng.sample(rows, min(n, SAMPLE))
+    logins = make_logins(users, rng)
+    emails, passwords = make_credentials(rng)
+    results = {}
+
+    def record(case, seconds, ops):
+        results[case] = {"seconds": seconds, "ops": ops, "us_per_op": seconds / ops * 1e6}
+
+    with synthetic_catalog(rows) as catalog:
+        start = time.perf_counter()
+        snapshot = catalog.snapshot()
+        record("catalog_load", time.perf_counter() - start, n)
+
+        manager = MedicineManager()
+        medicines = list(snapshot.medicines)
+
+        def filter_and_sort():
+            found = manager.filter_medicines(medicines, "ol", "All", True)
+            found.sort(key=lambda m: m.get("price") or 0)
+        record("filter_sort_medicines", best_of(filter_and_sort, repeat), n)
+
+        query = MedicineQuery(search_term="para", sort_by="Price")
+        record("search_medicines", best_of(lambda: manager.search_medicines(query), repeat), n)
+
+        record("is_expired", best_of(lambda: [manager.is_expired(m) for m in sample], repeat),
+               len(sample))
+
+        record("cart_expiry_status", best_of(
+            lambda: [CartUtils.get_expiry_status(str(m["expiry_date"]), m["id"]) for m in sample],
+            repeat), len(sample))
+        record("cart_expiry_status_uncached", best_of(
+            lambda: [CartUtils.get_expiry_status(str(m["expiry_date"])) for m in sample],
+            repeat), len(sample))
+
+    lines = [dict(med, qty=1 + i % 5) for i, med in enumerate(rows)]
+    record("cart_build", best_of(lambda: Cart(lines), repeat), n)
+    page = CartPage.__new__(CartPage)
+    page.cart = Cart(lines)
+    keys = [m["id"] for m in sample]
+    record("cart_set_qty", best_of(lambda: [page.cart.set_qty(k, 3) for k in keys], repeat), len(keys))
+    record("cart_total_amount", best_of(page.get_total_amount, repeat), 1)
+    del page, lines
+
+    with synthetic_users(users):
+        login = LoginPage()
+
+        def authenticate_all():
+            for login.username, login.password in logins:
+                login.authenticate_user()
+        record("authenticate_user", best_of(authenticate_all, repeat), len(logins))
+
+    record("validate_email", best_of(
+        lambda: [Validator.is_valid_email(email) for email in emails], repeat), len(emails))
+    record("validate_password", best_of(
+        lambda: [Validator.is_valid_password(password) for password in passwords], repeat),
+        len(passwords))
+    return results
+
+# -------------------------------
+# 📊 Baseline Comparison
+# -------------------------------
+def flatten(report):
+    """Map ``case@size`` (or ``import_main``) to seconds."""
+    timings = {"import_main": report["import"]["seconds"]}
+    for size, cases in report["sizes"].items():
+        for case, result in cases.items():
+            timings[f"{case}@{size}"] = result["seconds"]
+    return timings
+
+
+def compare(report, baseline, tolerance):
+    """Return ``(key, baseline, current)`` for every case that got slower."""
+    current, previous = flatten(report), flatten(baseline)
+    regressions = []
+    for key, seconds in sorted(current.items()):
+        before = previous.get(key)
+        if before is None:
+            continue
+        if seconds > before * (1 + tolerance) and seconds - before > NOISE_FLOOR:
+            regressions.append((key, before, seconds))
+    return regressions
+
+
+def print_report(report, baseline):
+    previous = flatten(baseline) if baseline else {}
+    print(f"{'case':<40}{'seconds':>12}{'us/op':>12}{'vs base':>10}")
+    for key, seconds in flatten(report).items():
+        case, _, size = key.partition("@")
+        per_op = f"{report['sizes'][size][case]['us_per_op']:.2f}" if size else "-"
+        change = f"{(seconds / previous[key] - 1) * 100:+.0f}%" if previous.get(key) else ""
+        print(f"{key:<40}{seconds:>12.4f}{per_op:>12}{change:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark MediCare hot paths on synthetic data.")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated row counts (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case; the best is kept")
+    parser.add_argument("--output", type=Path, default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE,
+                        help="results to compare with; the first run writes it if missing")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="allowed slowdown before a case counts as a regression")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="store this run as the new baseline")
+    args = parser.parse_args(argv)
+
+    # Streamlit warns about the missing script context on every widget-free call
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    sys.path.insert(0, str(ROOT))
+
+    import_seconds, eager = measure_import(args.repeat)
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "repeat": args.repeat,
+            "sample": SAMPLE,
+        },
+        "import": {"seconds": import_seconds, "eager_modules": eager},
+        "sizes": {},
+    }
+    for size in (int(s) for s in args.sizes.split(",") if s.strip()):
+        print(f"Benchmarking {size:,} rows...", file=sys.stderr)
+        report["sizes"][str(size)] = bench_size(size, args.repeat)
+
+    args.output.write_text(json.dumps(report, indent=2))
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else None
+    print_report(report, baseline)
+
+    failed = False
+    if eager:
+        print(f"\n`import main` eagerly loaded: {', '.join(eager)}")
+        failed = True
+
+    if args.update_baseline or baseline is None:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print(f"\nBaseline {'updated' if baseline else 'stored (first run)'}: {args.baseline}")
+    else:
+        regressions = compare(report, baseline, args.tolerance)
+        for key, before, after in regressions:
+            print(f"REGRESSION {key}: {before:.4f}s -> {after:.4f}s")
+        failed = failed or bool(regressions)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
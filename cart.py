@@ -1,34 +1,176 @@
 # cart.py
 import streamlit as st
-import datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, Optional
+from utils import Catalog, CartStore
+from expiry import EXPIRED, EXPIRING, UNKNOWN, status_for
 
 
 class CartUtils:
     @staticmethod
-    def get_expiry_status(expiry_date_str: str) -> str:
-        try:
-            expiry_parts = expiry_date_str.split('-')
-            if len(expiry_parts) == 3:
-                expiry_date = datetime.datetime(
-                    int(expiry_parts[0]),
-                    int(expiry_parts[1]),
-                    int(expiry_parts[2])
-                )
-                days_until_expiry = (expiry_date - datetime.datetime.now()).days
-                if days_until_expiry < 0:
-                    return "⚠️ EXPIRED"
-                elif days_until_expiry <= 30:
-                    return f"⏰ Expires in {days_until_expiry} days"
-                else:
-                    return "✅ Fresh"
-        except Exception:
+    def get_expiry_status(expiry_date_str: str, medicine_id=None) -> str:
+        # Catalog items read the status precomputed for the snapshot
+        status = Catalog.snapshot().expiry.lookup(medicine_id) if medicine_id is not None else None
+        if status is None:
+            status = status_for(expiry_date_str)
+
+        if status.status == UNKNOWN:
+            if not expiry_date_str or expiry_date_str == "Not specified":
+                return "📅 Unknown"
             return "📅 Date format invalid"
-        return "📅 Unknown"
+        if status.status == EXPIRED:
+            return "⚠️ EXPIRED"
+        if status.status == EXPIRING:
+            return f"⏰ Expires in {status.days_left} days"
+        return "✅ Fresh"
+
+
+class Cart:
+    """Cart lines keyed by medicine id, with running totals.
+
+    Adding a medicine that is already in the cart merges the quantities.
+    ``item_count``, ``total_qty`` and ``total_amount`` are kept up to date on
+    every change, so reading them is O(1). Iterating yields the line dicts
+    (``id``, ``name``, ``price``, ``qty``, ...) in insertion order, which is
+    what ``Order.insert_order`` expects.
+
+    A cart with an ``owner`` (username) reports every change to CartStore,
+    which persists it write-behind.
+
+    A line holds at most ``MAX_QTY`` units (the cart page's quantity
+    limit); merging or setting more caps it there.
+    """
+    MAX_QTY = 99
+
+    def __init__(self, items: Iterable[Dict[str, Any]] = (), owner: Optional[str] = None):
+        self._lines: Dict[Any, Dict[str, Any]] = {}
+        self.total_qty = 0
+        self.total_amount = Decimal("0")
+        self.owner = None
+        for item in items:
+            self.add(item)
+        self.owner = owner
+
+    @staticmethod
+    def current() -> "Cart":
+        """Return the session's cart, loading the logged-in user's saved cart if needed."""
+        username = st.session_state.get("current_user") or None
+        cart = st.session_state.get("cart")
+        if isinstance(cart, Cart) and cart.owner == username:
+            return cart
+
+        if username is None:
+            cart = cart if isinstance(cart, Cart) else Cart(cart if isinstance(cart, list) else ())
+        elif isinstance(cart, list) and cart:
+            # Lines from an older session format are saved for the user
+            legacy, cart = cart, Cart(owner=username)
+            for item in legacy:
+                cart.add(item)
+        else:
+            cart = Cart.load(username)
+        st.session_state["cart"] = cart
+        return cart
+
+    @staticmethod
+    def load(username: str) -> "Cart":
+        """Rebuild a user's saved cart, taking names and prices from the catalog."""
+        by_id = Catalog.snapshot().by_id
+        items = []
+        for med_id, qty in CartStore.load(username).items():
+            med = by_id.get(med_id)
+            if med is None:
+                continue  # medicine no longer in the catalog
+            items.append({
+                "id": med_id,
+                "name": med.get("name"),
+                "price": med.get("price"),
+                "qty": qty,
+                "category": med.get("category"),
+                "expiry_date": med.get("expiry_date"),
+            })
+        return Cart(items, owner=username)
+
+    def _persist(self, line: Dict[str, Any], qty: int):
+        # Lines without a medicine id (legacy, name-keyed) stay session-only
+        if self.owner is not None and line.get("id") is not None:
+            CartStore.record(self.owner, line["id"], qty)
+
+    @staticmethod
+    def key_for(item: Dict[str, Any]) -> Any:
+        return item.get("id") if item.get("id") is not None else item.get("name")
+
+    @staticmethod
+    def _amount(price: Any, qty: int) -> Decimal:
+        # Decimal keeps the running total exact across many adds and removes
+        return Decimal(str(price or 0)) * qty
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return iter(list(self._lines.values()))
+
+    def __contains__(self, key: Any) -> bool:
+        return key in self._lines
+
+    @property
+    def item_count(self) -> int:
+        return len(self._lines)
+
+    def get(self, key: Any) -> Optional[Dict[str, Any]]:
+        return self._lines.get(key)
+
+    def add(self, item: Dict[str, Any], qty: Optional[int] = None):
+        """Add a line, or increase the quantity of the existing line for it."""
+        qty = int(item.get("qty", 1) if qty is None else qty)
+        if qty <= 0:
+            return
+        key = Cart.key_for(item)
+        line = self._lines.get(key)
+        qty = min(qty, Cart.MAX_QTY - (line["qty"] if line is not None else 0))
+        if qty <= 0:
+            return
+        if line is None:
+            line = dict(item, qty=0)
+            self._lines[key] = line
+        line["qty"] += qty
+        self.total_qty += qty
+        self.total_amount += Cart._amount(line.get("price"), qty)
+        self._persist(line, line["qty"])
+
+    def set_qty(self, key: Any, qty: int):
+        """Set a line's quantity; zero or less removes it."""
+        line = self._lines.get(key)
+        if line is None:
+            return
+        if qty <= 0:
+            self.remove(key)
+            return
+        qty = min(int(qty), Cart.MAX_QTY)
+        delta = qty - line["qty"]
+        line["qty"] = qty
+        self.total_qty += delta
+        self.total_amount += Cart._amount(line.get("price"), delta)
+        self._persist(line, line["qty"])
+
+    def remove(self, key: Any):
+        line = self._lines.pop(key, None)
+        if line is not None:
+            self.total_qty -= line["qty"]
+            self.total_amount -= Cart._amount(line.get("price"), line["qty"])
+            self._persist(line, 0)
+
+    def clear(self):
+        self._lines.clear()
+        self.total_qty = 0
+        self.total_amount = Decimal("0")
+        if self.owner is not None:
+            CartStore.record_clear(self.owner)
 
 
 class CartPage:
     def __init__(self):
-        self.cart = st.session_state.get("cart", [])
+        self.cart = Cart.current()
         self.cart_quantities = st.session_state.get("cart_quantities", {})
 
     def show(self) -> bool:
@@ -50,64 +192,70 @@ class CartPage:
 
     def render_empty_cart(self) -> bool:
         st.info("🛍️ Your cart is empty. Start shopping to add medicines!")
-        if st.button("Browse Medicines", key="browse_meds", type="primary", use_container_width=True):
-            st.session_state["dashboard_menu_selected"] = 0
-            st.rerun()
+        st.button("Browse Medicines", key="browse_meds", type="primary", use_container_width=True,
+                  on_click=CartPage._browse)
         return False
 
     def show_summary(self):
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("Items in Cart", len(self.cart))
+            st.metric("Items in Cart", self.cart.item_count)
         with col2:
-            total_qty = sum(item['qty'] for item in self.cart)
-            st.metric("Total Quantity", total_qty)
+            st.metric("Total Quantity", self.cart.total_qty)
         with col3:
-            total_amount = self.get_total_amount()
-            st.metric("Total Amount", f"₹{total_amount}")
+            st.metric("Total Amount", f"₹{self.get_total_amount()}")
 
     def render_cart_items(self):
-        for i, item in enumerate(self.cart):
+        # Widgets are keyed by medicine id; callbacks update the cart before
+        # the next rerun, so no explicit st.rerun() is needed
+        for item in self.cart:
+            key = Cart.key_for(item)
             with st.container():
                 col1, col2, col3, col4 = st.columns([3, 1, 1, 1])
                 with col1:
                     st.write(f"**{item['name']}**")
                     st.write(f"Price: ₹{item['price']} per unit")
-                    expiry_text = CartUtils.get_expiry_status(item.get('expiry_date', 'Not specified'))
+                    expiry_text = CartUtils.get_expiry_status(item.get('expiry_date', 'Not specified'), item.get('id'))
                     st.write(f"Expiry: {expiry_text}")
                 with col2:
-                    new_qty = st.number_input("Qty", min_value=1, max_value=99, value=item['qty'], key=f"qty_{i}")
-                    if new_qty != item['qty']:
-                        self.cart[i]['qty'] = new_qty
-                        st.session_state["cart"] = self.cart
-                        st.rerun()
+                    st.number_input("Qty", min_value=1, max_value=Cart.MAX_QTY, value=item['qty'],
+                                    key=f"cart_qty_{key}", on_change=self._on_qty_change, args=(key,))
                 with col3:
                     subtotal = item['price'] * item['qty']
                     st.write(f"**₹{subtotal}**")
                 with col4:
-                    if st.button("Remove", key=f"remove_{i}", type="secondary"):
-                        self.cart.pop(i)
-                        st.session_state["cart"] = self.cart
-                        st.rerun()
+                    st.button("Remove", key=f"remove_{key}", type="secondary",
+                              on_click=self.cart.remove, args=(key,))
             st.divider()
 
     def render_action_buttons(self):
         col1, col2, col3 = st.columns(3)
         with col1:
-            if st.button("Continue Shopping", key="continue_shopping", use_container_width=True):
-                st.session_state["dashboard_menu_selected"] = 0
-                st.rerun()
+            st.button("Continue Shopping", key="continue_shopping", use_container_width=True,
+                      on_click=CartPage._browse)
         with col2:
-            if st.button("Clear Cart", use_container_width=True, type="secondary"):
-                st.session_state["cart"] = []
-                st.session_state["cart_quantities"] = {}
-                st.rerun()
+            st.button("Clear Cart", use_container_width=True, type="secondary",
+                      on_click=self._clear)
         with col3:
-            if st.button("Order Now", key="order_now", use_container_width=True, type="primary"):
-                st.session_state["current_page"] = "order"
-                st.rerun()
+            st.button("Order Now", key="order_now", use_container_width=True, type="primary",
+                      on_click=CartPage._order_now)
 
         st.success(f"**Total Amount: ₹{self.get_total_amount()}**")
 
-    def get_total_amount(self) -> float:
-        return sum(item['price'] * item['qty'] for item in self.cart)
+    def get_total_amount(self) -> Decimal:
+        return self.cart.total_amount
+
+    def _on_qty_change(self, key):
+        self.cart.set_qty(key, st.session_state[f"cart_qty_{key}"])
+
+    def _clear(self):
+        self.cart.clear()
+        st.session_state["cart_quantities"] = {}
+
+    @staticmethod
+    def _browse():
+        st.session_state["dashboard_menu_selected"] = 0
+
+    @staticmethod
+    def _order_now():
+        st.session_state["current_page"] = "order"
@@ -2,13 +2,19 @@ import streamlit as st
 import logging
 
 from utils import StreamlitHelper
-from medicines import MedicineUI
-from orders import OrderUI
-from consult import ConsultationPage, ConsultationHistory
+from assets import AssetPipeline
+from tracing import Tracer
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+MEDICINE_ICONS = ["⚕️", "🩺", "💊", "🏥", "🔬", "🧬", "⚕️", "🩺", "💊", "🏥"]
+MEDICINE_BACKGROUND_HTML = (
+    '<div class="medicine-background">'
+    + "".join(f'<div class="medicine-icon">{icon}</div>' for icon in MEDICINE_ICONS)
+    + '</div>'
+)
+
 class DashboardSessionManager:
     def initialize(self):
         defaults = {
@@ -26,9 +32,10 @@ class DashboardSessionManager:
                 st.session_state[key] = default_value
 
     def clear(self):
-        keys = ["is_logged_in", "current_user", "cart", "cart_quantities", "user_preferences", "dashboard_menu_selected"]
+        keys = ["is_logged_in", "current_user", "current_role", "cart", "cart_quantities", "user_preferences", "dashboard_menu_selected"]
         for key in keys:
-            st.session_state[key] = {} if key in ["cart", "cart_quantities", "user_preferences"] else \
+            st.session_state[key] = [] if key == "cart" else \
+                {} if key in ["cart_quantities", "user_preferences"] else \
                 False if key == "is_logged_in" else \
                 0 if key == "dashboard_menu_selected" else ""
         st.session_state["current_page"] = "landing"
@@ -39,7 +46,7 @@ class DashboardUI:
         self.apply_custom_css()
 
     def apply_custom_css(self):
-        st.markdown("""
+        AssetPipeline.inject_css("dashboard", """
         <style>
         /* Import Google Fonts */
         @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
@@ -405,19 +412,13 @@ class DashboardUI:
             }
         }
         </style>
-        """, unsafe_allow_html=True)
+        """)
 
     def add_medicine_background(self):
         """Add subtle professional medicine icons to the background"""
-        medicine_icons = ["⚕️", "🩺", "💊", "🏥", "🔬", "🧬", "⚕️", "🩺", "💊", "🏥"]
-        
-        background_html = '<div class="medicine-background">'
-        for icon in medicine_icons:
-            background_html += f'<div class="medicine-icon">{icon}</div>'
-        background_html += '</div>'
-        
-        st.markdown(background_html, unsafe_allow_html=True)
+        st.markdown(MEDICINE_BACKGROUND_HTML, unsafe_allow_html=True)
 
+    @Tracer.traced()
     def setup_page(self):
         try:
             st.set_page_config(
@@ -432,6 +433,7 @@ class DashboardUI:
         # Add animated background immediately after page setup
         self.add_medicine_background()
 
+    @Tracer.traced()
     def header(self):
         st.markdown("""
         <div class="main-header animated-card">
@@ -448,6 +450,7 @@ class DashboardUI:
             </div>
             """, unsafe_allow_html=True)
 
+    @Tracer.traced()
     def sidebar_menu(self) -> str:
         # Sidebar header
         st.sidebar.markdown("""
@@ -457,7 +460,7 @@ class DashboardUI:
         """, unsafe_allow_html=True)
         
         # User info
-        cart_count = len(st.session_state.get("cart", []))
+        cart_count = len(st.session_state.get("cart", []))  # O(1) for the keyed Cart
         st.sidebar.markdown(f"""
         <div class="user-info">
             <strong>🧑💻 {self.username}</strong>
@@ -479,6 +482,8 @@ class DashboardUI:
             ("👨⚕️ Consult Doctor", "Consult Doctor"),
             ("📋 Consultation History", "Consult History"),
         ]
+        if st.session_state.get("current_role") == "admin":
+            menu_options.append(("📤 Data Exports", "Exports"))
         
         menu_labels, menu_values = zip(*menu_options)
         
@@ -536,12 +541,18 @@ class DashboardController:
         self.handle_menu(selected_menu, username)
 
     def handle_menu(self, selected: str, username: str):
+        # One span per menu branch (MedicineUI.show, CartPage.show, ...)
+        with Tracer.span(f"handle_menu:{selected}"):
+            self._render_menu(selected, username)
+
+    def _render_menu(self, selected: str, username: str):
         st.markdown("<hr>", unsafe_allow_html=True)
         
         try:
             if selected == "Medicines":
                 with st.spinner("🔍 Loading medicines..."):
                     st.markdown('<div class="content-card animated-card">', unsafe_allow_html=True)
+                    from medicines import MedicineUI
                     MedicineUI(show_expiry=True).show()
                     st.markdown('</div>', unsafe_allow_html=True)
                     
@@ -555,21 +566,30 @@ class DashboardController:
             elif selected == "Orders":
                 with st.spinner("📦 Retrieving your orders..."):
                     st.markdown('<div class="content-card animated-card">', unsafe_allow_html=True)
+                    from orders import OrderUI
                     OrderUI.show_user_orders(username)
                     st.markdown('</div>', unsafe_allow_html=True)
                     
             elif selected == "Consult Doctor":
                 with st.spinner("💬 Preparing consultation..."):
                     st.markdown('<div class="content-card animated-card">', unsafe_allow_html=True)
+                    from consult import ConsultationPage
                     ConsultationPage(username).display_form()
                     st.markdown('</div>', unsafe_allow_html=True)
                     
             elif selected == "Consult History":
                 with st.spinner("📋 Fetching consultation history..."):
                     st.markdown('<div class="content-card animated-card">', unsafe_allow_html=True)
+                    from consult import ConsultationHistory
                     ConsultationHistory(username).display_consultations()
                     st.markdown('</div>', unsafe_allow_html=True)
                     
+            elif selected == "Exports" and st.session_state.get("current_role") == "admin":
+                st.markdown('<div class="content-card animated-card">', unsafe_allow_html=True)
+                from exports import ExportUI
+                ExportUI.show()
+                st.markdown('</div>', unsafe_allow_html=True)
+                    
             else:
                 st.markdown("""
                 <div class="content-card animated-card" style="text-align: center;">
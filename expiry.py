@@ -0,0 +1,149 @@
+# expiry.py
+
+import threading
+from datetime import date, datetime
+from typing import Any, Iterable, NamedTuple, Optional
+
+import numpy as np
+
+WARN_DAYS = 30
+
+EXPIRED = "expired"
+EXPIRING = "expiring"
+FRESH = "fresh"
+UNKNOWN = "unknown"
+
+_STATUS_NAMES = (UNKNOWN, EXPIRED, EXPIRING, FRESH)
+_STATUS_CODES = {name: code for code, name in enumerate(_STATUS_NAMES)}
+_UNKNOWN, _EXPIRED, _EXPIRING, _FRESH = range(4)
+
+
+class ExpiryStatus(NamedTuple):
+    status: str
+    days_left: Optional[int]
+    expiry_date: Optional[date]
+
+
+def parse_dates(values: Iterable[Any]) -> np.ndarray:
+    """Parse dates / 'YYYY-MM-DD' strings into ``datetime64[D]`` (NaT if invalid)."""
+    texts = [str(value)[:10] if value else "NaT" for value in values]
+    try:
+        return np.array(texts, dtype="datetime64[D]")
+    except ValueError:
+        parsed = np.empty(len(texts), dtype="datetime64[D]")
+        for i, text in enumerate(texts):
+            try:
+                parsed[i] = np.datetime64(text, "D")
+            except ValueError:
+                parsed[i] = np.datetime64("NaT")
+        return parsed
+
+
+def classify(dates: np.ndarray, today: Optional[date] = None, warn_days: int = WARN_DAYS):
+    """Classify a date array in bulk; return ``(days_left, status_codes)``."""
+    today64 = np.datetime64(today or date.today(), "D")
+    missing = np.isnat(dates)
+    days_left = (dates - today64).astype("timedelta64[D]").astype(np.int64)
+    days_left[missing] = 0
+    codes = np.select(
+        [missing, days_left < 0, days_left <= warn_days],
+        [_UNKNOWN, _EXPIRED, _EXPIRING],
+        default=_FRESH
+    ).astype(np.uint8)
+    return days_left, codes
+
+
+def parse_date(value: Any) -> Optional[date]:
+    """Parse one date / 'YYYY-MM-DD' string; None if missing or invalid."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def status_for(value: Any, today: Optional[date] = None, warn_days: int = WARN_DAYS) -> ExpiryStatus:
+    """Classify a single expiry value (for rows outside a precomputed table)."""
+    expiry = parse_date(value)
+    if expiry is None:
+        return ExpiryStatus(UNKNOWN, None, None)
+    days_left = (expiry - (today or date.today())).days
+    status = EXPIRED if days_left < 0 else EXPIRING if days_left <= warn_days else FRESH
+    return ExpiryStatus(status, days_left, expiry)
+
+
+class ExpiryTable:
+    """Expiry dates of a catalog, parsed once and classified per day in bulk.
+
+    The day's classification is kept as plain Python lists (days left,
+    status codes, dates), so a lookup indexes lists instead of NumPy arrays.
+    """
+
+    def __init__(self, keys: Iterable[Any], values: Iterable[Any]):
+        keys = list(keys)
+        self._index = {key: i for i, key in enumerate(keys)}
+        self.dates = parse_dates(values)
+        self._classified = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def with_value(self, key: Any, value: Any) -> "ExpiryTable":
+        """Return a copy with one key's expiry date set (added if new)."""
+        table = ExpiryTable.__new__(ExpiryTable)
+        table._index = dict(self._index)
+        parsed = parse_dates([value])
+        if key in table._index:
+            table.dates = self.dates.copy()
+            table.dates[table._index[key]] = parsed[0]
+        else:
+            table._index[key] = len(self.dates)
+            table.dates = np.concatenate([self.dates, parsed])
+        table._classified = None
+        cached = self._classified
+        if cached is not None:
+            # Carry the day's classification over, patching just this row
+            (day, warn_days), columns = cached
+            status = status_for(value, day, warn_days)
+            row = (status.days_left if status.days_left is not None else 0,
+                   _STATUS_CODES[status.status], status.expiry_date)
+            columns = tuple(list(column) for column in columns)
+            for column, item in zip(columns, row):
+                if table._index[key] < len(column):
+                    column[table._index[key]] = item
+                else:
+                    column.append(item)
+            table._classified = ((day, warn_days), columns)
+        table._lock = threading.Lock()
+        return table
+
+    def classified(self, today: Optional[date] = None, warn_days: int = WARN_DAYS):
+        """Return ``(days_left, codes, dates)`` lists for every row, computed in bulk and cached per day."""
+        today = today or date.today()
+        cached = self._classified
+        if cached is None or cached[0] != (today, warn_days):
+            with self._lock:
+                cached = self._classified
+                if cached is None or cached[0] != (today, warn_days):
+                    days_left, codes = classify(self.dates, today, warn_days)
+                    columns = (days_left.tolist(), codes.tolist(), self.dates.tolist())
+                    cached = ((today, warn_days), columns)
+                    self._classified = cached
+        return cached[1]
+
+    def lookup(self, key: Any, today: Optional[date] = None,
+               warn_days: int = WARN_DAYS) -> Optional[ExpiryStatus]:
+        i = self._index.get(key)
+        if i is None:
+            return None
+        days_left, codes, dates = self.classified(today, warn_days)
+        code = codes[i]
+        if code == _UNKNOWN:
+            return ExpiryStatus(UNKNOWN, None, None)
+        return ExpiryStatus(_STATUS_NAMES[code], days_left[i], dates[i])
@@ -0,0 +1,180 @@
+# exports.py
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, TextIO
+
+from utils import Consultation, Medicine, Order
+
+logger = logging.getLogger(__name__)
+
+# Export name -> row generator (each streams through DBHelper.stream)
+EXPORTS: Dict[str, Callable[[], Iterator[Dict[str, Any]]]] = {
+    "medicines": Medicine.iter_all,
+    "orders": Order.iter_all,
+    "consultations": Consultation.iter_all,
+}
+FORMATS = ("csv", "jsonl")
+MIME_TYPES = {"csv": "text/csv", "jsonl": "application/x-ndjson"}
+TEMP_PREFIX = "medicare-export-"
+TEMP_TTL = 3600  # seconds an export file is kept for (repeat) downloads
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, bytes):
+        return value.decode("utf-8", "replace")
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+# -------------------------------
+# ✍️ Writers
+# -------------------------------
+def write_csv(rows: Iterable[Dict[str, Any]], stream: TextIO) -> int:
+    """Write rows as CSV (header from the first row); return the row count."""
+    writer = None
+    count = 0
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(stream, fieldnames=list(row), extrasaction="ignore")
+            writer.writeheader()
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_jsonl(rows: Iterable[Dict[str, Any]], stream: TextIO) -> int:
+    count = 0
+    for row in rows:
+        stream.write(json.dumps(row, default=_json_default, ensure_ascii=False))
+        stream.write("\n")
+        count += 1
+    return count
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl}
+
+# -------------------------------
+# 📤 Exports
+# -------------------------------
+def export_to_file(name: str, path: Path, fmt: Optional[str] = None) -> int:
+    """Stream export ``name`` into ``path``; the format defaults to the extension."""
+    fmt = fmt or path.suffix.lstrip(".").lower()
+    if fmt not in WRITERS:
+        raise ValueError(f"Unknown export format {fmt!r}; use one of {', '.join(FORMATS)}.")
+    started = time.perf_counter()
+    with open(path, "w", newline="", encoding="utf-8") as stream:
+        count = WRITERS[fmt](EXPORTS[name](), stream)
+    logger.info("Exported %d %s rows to %s in %.1fs", count, name, path, time.perf_counter() - started)
+    return count
+
+
+def export_to_tempfile(name: str, fmt: str = "csv") -> Path:
+    """Stream an export into a temporary file and return its path (caller deletes it)."""
+    handle, path = tempfile.mkstemp(prefix=f"{TEMP_PREFIX}{name}-", suffix=f".{fmt}")
+    os.close(handle)
+    try:
+        export_to_file(name, Path(path), fmt)
+    except BaseException:
+        os.unlink(path)
+        raise
+    return Path(path)
+
+
+def remove_stale_tempfiles(max_age: float = TEMP_TTL) -> int:
+    """Delete export temp files older than ``max_age`` seconds."""
+    cutoff = time.time() - max_age
+    removed = 0
+    for path in Path(tempfile.gettempdir()).glob(f"{TEMP_PREFIX}*"):
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except OSError:
+            pass  # already gone
+    return removed
+
+
+def read_export(path: str) -> bytes:
+    with open(path, "rb") as data:
+        return data.read()
+
+
+class ExportUI:
+    """Admin controls to build an export and offer it as a download.
+
+    The rows are streamed from the database into a temporary file, so the
+    worker never holds them as Python objects. The file is built only when
+    asked for and read only when the download is clicked; it is kept for
+    repeat clicks until it is ``TEMP_TTL`` seconds old.
+
+    Streamlit serves a download from memory, so each click still holds
+    the whole file as bytes in the worker while it is sent. For exports
+    too large for that, use the CLI (``python exports.py``), which streams
+    to disk.
+    """
+
+    def __init__(self, name: str, fmt: str = "csv"):
+        self.name = name
+        self.fmt = fmt
+        self.state_key = f"export_{name}_{fmt}"
+
+    def render(self):
+        import streamlit as st
+
+        path = st.session_state.get(self.state_key)
+        if path and os.path.exists(path):
+            st.download_button(
+                f"⬇️ Download {self.name}.{self.fmt}", data=lambda: read_export(path),
+                file_name=f"{self.name}.{self.fmt}", mime=MIME_TYPES[self.fmt],
+                key=f"{self.state_key}_download", on_click="ignore"
+            )
+        else:
+            st.button(f"Prepare {self.name} export ({self.fmt.upper()})",
+                      key=f"{self.state_key}_build", on_click=self._build)
+
+    def _build(self):
+        import streamlit as st
+
+        remove_stale_tempfiles()
+        previous = st.session_state.pop(self.state_key, None)
+        if previous and os.path.exists(previous):
+            os.unlink(previous)
+        st.session_state[self.state_key] = str(export_to_tempfile(self.name, self.fmt))
+
+    @staticmethod
+    def show():
+        """The admin dashboard's exports page: one control per export."""
+        import streamlit as st
+
+        st.markdown("### 📤 Data Exports")
+        fmt = st.radio("Format", FORMATS, horizontal=True, key="export_format")
+        for name in EXPORTS:
+            ExportUI(name, fmt).render()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export MediCare tables to CSV or JSON lines.")
+    parser.add_argument("name", choices=sorted(EXPORTS))
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--format", choices=FORMATS, help="default: from the file extension")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    count = export_to_file(args.name, args.path, args.format)
+    print(f"Exported {count:,} {args.name} rows to {args.path}.")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,292 @@
+# importer.py
+
+import argparse
+import csv
+import io
+import json
+import logging
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from utils import Catalog, Medicine, UnitOfWork
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1000
+PROGRESS_INTERVAL = 5.0  # seconds between progress reports
+MAX_REPORTED_ERRORS = 100
+
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+FALSE_VALUES = {"", "0", "false", "no", "n", "f"}
+TEXT_LIMITS = {"name": 100, "category": 50, "manufacturer": 100}
+MAX_PRICE = Decimal("99999999.99")  # medicines.price is DECIMAL(10,2)
+MAX_STOCK = 2147483647  # medicines.stock is INT
+CENT = Decimal("0.01")
+
+
+class ImportRowError(ValueError):
+    """A source row that failed validation."""
+
+    def __init__(self, line: int, message: str):
+        super().__init__(f"line {line}: {message}")
+        self.line = line
+        self.message = message
+
+# -------------------------------
+# 📥 Readers
+# -------------------------------
+def read_csv(stream: io.TextIOBase) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def read_jsonl(stream: io.TextIOBase) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield line_no, ImportRowError(line_no, f"invalid JSON ({e.msg})")
+            continue
+        if not isinstance(row, dict):
+            yield line_no, ImportRowError(line_no, "expected a JSON object")
+            continue
+        yield line_no, row
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+def detect_format(path: Path) -> str:
+    suffix = path.suffix.lower()
+    if suffix == ".csv":
+        return "csv"
+    if suffix in (".jsonl", ".ndjson", ".json"):
+        return "jsonl"
+    raise ValueError(f"Cannot tell the format of {path.name}; pass --format.")
+
+# -------------------------------
+# ✅ Validation
+# -------------------------------
+def _text(row, key, line, required=False):
+    value = row.get(key)
+    value = "" if value is None else str(value).strip()
+    if required and not value:
+        raise ImportRowError(line, f"'{key}' is required")
+    limit = TEXT_LIMITS.get(key)
+    if limit and len(value) > limit:
+        raise ImportRowError(line, f"'{key}' is longer than {limit} characters")
+    return value or None
+
+
+def _number(row, key, line, cast, maximum, default=None, quantum=None):
+    value = row.get(key)
+    if value is None or str(value).strip() == "":
+        if default is None:
+            raise ImportRowError(line, f"'{key}' is required")
+        return default
+    try:
+        number = cast(str(value).strip())
+        if isinstance(number, Decimal):
+            if not number.is_finite():
+                raise ValueError(value)
+            if quantum is not None:
+                number = number.quantize(quantum)
+    except (ValueError, InvalidOperation):
+        raise ImportRowError(line, f"'{key}' is not a valid number: {value!r}")
+    if number < 0:
+        raise ImportRowError(line, f"'{key}' must not be negative")
+    if number > maximum:
+        raise ImportRowError(line, f"'{key}' must not be more than {maximum}")
+    return number
+
+
+def validate_row(row: Dict[str, Any], line: int) -> Tuple:
+    """Check and normalize one source row into a Medicine.COLUMNS tuple."""
+    raw_id = row.get("id")
+    med_id = None
+    if raw_id not in (None, ""):
+        try:
+            med_id = int(str(raw_id).strip())
+        except ValueError:
+            raise ImportRowError(line, f"'id' is not an integer: {raw_id!r}")
+
+    price = _number(row, "price", line, Decimal, MAX_PRICE, quantum=CENT)
+    stock = _number(row, "stock", line, int, MAX_STOCK, default=0)
+
+    expiry = row.get("expiry_date")
+    expiry_date = None
+    if expiry not in (None, ""):
+        try:
+            expiry_date = date.fromisoformat(str(expiry).strip()[:10])
+        except ValueError:
+            raise ImportRowError(line, f"'expiry_date' is not a YYYY-MM-DD date: {expiry!r}")
+
+    flag = row.get("requires_prescription")
+    flag = "" if flag is None else str(flag).strip().lower()  # missing or JSON null: not required
+    if flag not in TRUE_VALUES and flag not in FALSE_VALUES:
+        raise ImportRowError(line, f"'requires_prescription' is not a yes/no value: {flag!r}")
+
+    return (
+        med_id,
+        _text(row, "name", line, required=True),
+        _text(row, "description", line),
+        _text(row, "category", line),
+        price,
+        stock,
+        expiry_date,
+        _text(row, "manufacturer", line),
+        int(flag in TRUE_VALUES),
+    )
+
+# -------------------------------
+# 🚚 Import
+# -------------------------------
+@dataclass
+class ImportReport:
+    read: int = 0
+    valid: int = 0
+    written: int = 0  # stays 0 in a dry run
+    rejected: int = 0
+    chunks: int = 0
+    elapsed: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def rate(self) -> float:
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+    def summary(self) -> str:
+        return (f"{self.read:,} rows read, {self.valid:,} valid, {self.written:,} written, "
+                f"{self.rejected:,} rejected "
+                f"in {self.elapsed:.1f}s ({self.rate:,.0f} rows/s)")
+
+
+class CatalogImporter:
+    """Streams a supplier feed into the medicines table.
+
+    Rows are validated one at a time and written in chunks of
+    ``chunk_size`` as multi-row upserts, one transaction per chunk, so
+    memory stays bounded by the chunk. Invalid rows are skipped and
+    reported; the import stops once more than ``max_errors`` rows were
+    rejected. The catalog snapshot (and its search index) is refreshed
+    once, after the last chunk.
+
+    Rows without an id are matched to an existing medicine by name,
+    ignoring case as the column's collation does (the lowest id if the
+    catalog already holds the name twice), so importing the same feed
+    again updates those medicines instead of adding copies. Within one
+    chunk the last row for a name wins.
+    """
+
+    def __init__(self, chunk_size: int = CHUNK_SIZE, max_errors: Optional[int] = None,
+                 dry_run: bool = False, progress: Optional[Callable[[ImportReport], None]] = None):
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.dry_run = dry_run
+        self.progress = progress or (lambda report: logger.info("Importing: %s", report.summary()))
+
+    def run(self, rows: Iterable[Tuple[int, Any]]) -> ImportReport:
+        report = ImportReport()
+        started = last_progress = time.perf_counter()
+        chunk = []
+        try:
+            for line, row in rows:
+                report.read += 1
+                try:
+                    if isinstance(row, ImportRowError):
+                        raise row
+                    chunk.append(validate_row(row, line))
+                except ImportRowError as e:
+                    self._reject(report, e)
+
+                if len(chunk) >= self.chunk_size:
+                    self._write(chunk, report)
+                    chunk = []
+                now = time.perf_counter()
+                if now - last_progress >= PROGRESS_INTERVAL:
+                    report.elapsed = now - started
+                    self.progress(report)
+                    last_progress = now
+            if chunk:
+                self._write(chunk, report)
+        finally:
+            report.elapsed = time.perf_counter() - started
+            if report.written:
+                Catalog.invalidate()
+        self.progress(report)
+        return report
+
+    def run_file(self, path: Path, fmt: Optional[str] = None) -> ImportReport:
+        reader = READERS[fmt or detect_format(path)]
+        with open(path, newline="", encoding="utf-8-sig") as stream:
+            return self.run(reader(stream))
+
+    def _reject(self, report: ImportReport, error: ImportRowError):
+        report.rejected += 1
+        if len(report.errors) < MAX_REPORTED_ERRORS:
+            report.errors.append(str(error))
+        if self.max_errors is not None and report.rejected > self.max_errors:
+            raise RuntimeError(f"Import stopped after {report.rejected} rejected rows ({error}).")
+
+    def _write(self, chunk: List[Tuple], report: ImportReport):
+        report.valid += len(chunk)
+        if not self.dry_run:
+            with UnitOfWork() as uow:
+                chunk = self._match_names(uow, chunk)
+                Medicine.upsert_many(uow, chunk)
+            report.written += len(chunk)
+        report.chunks += 1
+
+    @staticmethod
+    def _match_names(uow, chunk: List[Tuple]) -> List[Tuple]:
+        """Give id-less rows the id of the medicine that already has their name."""
+        by_name: Dict[str, Tuple] = {}  # casefolded name -> row
+        rows = []
+        for row in chunk:
+            if row[0] is None:
+                by_name[row[1].casefold()] = row  # the last row for a name wins
+            else:
+                rows.append(row)
+        if not by_name:
+            return rows
+        existing: Dict[str, int] = {}
+        for match in uow.fetch_all(
+            f"SELECT name, MIN(id) AS id FROM medicines "
+            f"WHERE name IN ({', '.join(['%s'] * len(by_name))}) GROUP BY name",
+            [row[1] for row in by_name.values()]
+        ):
+            name = match['name'].casefold()
+            existing[name] = min(existing.get(name, match['id']), match['id'])
+        rows.extend((existing.get(name),) + row[1:] for name, row in by_name.items())
+        return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import medicines from a CSV or JSON-lines feed.")
+    parser.add_argument("path", type=Path)
+    parser.add_argument("--format", choices=sorted(READERS), help="default: from the file extension")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--max-errors", type=int, help="stop after this many rejected rows")
+    parser.add_argument("--dry-run", action="store_true", help="validate only, write nothing")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    importer = CatalogImporter(args.chunk_size, args.max_errors, args.dry_run)
+    report = importer.run_file(args.path, args.format)
+    for error in report.errors:
+        print(f"rejected  {error}", file=sys.stderr)
+    print(("Validated " if args.dry_run else "Imported ") + report.summary())
+    return 1 if report.rejected else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
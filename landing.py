@@ -1,6 +1,7 @@
 # landing.py
 import streamlit as st
 from utils import StreamlitHelper  
+from assets import AssetPipeline
 
 
 class LandingPage:
@@ -17,7 +18,7 @@ class LandingPage:
         )
 
     def inject_custom_css(self):
-        st.markdown("""
+        AssetPipeline.inject_css("landing", """
         <style>
         /* Import Google Fonts */
         @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
@@ -263,7 +264,7 @@ class LandingPage:
             }
         }
         </style>
-        """, unsafe_allow_html=True)
+        """)
 
     def show(self):
         self.show_hero_section()
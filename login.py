@@ -1,12 +1,12 @@
 import streamlit as st
 import time
 from utils import StreamlitHelper, User  # ✅ fixed OOP imports
+from assets import AssetPipeline
 
 class LoginPage:
     def __init__(self):
         self.username = ""
         self.password = ""
-        self.user_data = {}
         self.max_login_attempts = 3
         self.lockout_duration = 300  # 5 minutes in seconds
 
@@ -24,7 +24,7 @@ class LoginPage:
         self.show_footer()
 
     def inject_custom_css(self):
-        st.markdown("""
+        AssetPipeline.inject_css("login", """
         <style>
         .main-header {
             text-align: center;
@@ -87,7 +87,7 @@ class LoginPage:
             border-radius: 5px;
         }
         </style>
-        """, unsafe_allow_html=True)
+        """)
 
     def show_header(self):
         st.markdown("""
@@ -133,11 +133,6 @@ class LoginPage:
                 
                 # Login button
                 login_button = st.form_submit_button("🚀 Login to Medicare Plus")
-                
-                # Load users from DB → Session
-                if "user_data" not in st.session_state:
-                    st.session_state["user_data"] = User.load_users()
-                self.user_data = st.session_state["user_data"]
 
                 if login_button:
                     self.handle_login()
@@ -210,18 +205,13 @@ class LoginPage:
         return None
 
     def authenticate_user(self):
-        # Check if user exists (by username or email)
-        user_key = None
-        for key, user_info in self.user_data.items():
-            if (key.lower() == self.username.lower() or 
-                user_info.get("email", "").lower() == self.username.lower()):
-                user_key = key
-                break
+        # Indexed point lookup by username or email
+        user_info = User.find_by_login(self.username)
         
-        if not user_key:
+        if not user_info:
             return {"success": False, "message": "User not found. Please check your credentials."}
         
-        user_info = self.user_data[user_key]
+        user_key = user_info.get("username", self.username)
         
         # Check if account is active
         if user_info.get("status") == "inactive":
@@ -246,7 +236,7 @@ class LoginPage:
 
     def set_session_state(self, user_info):
         st.session_state["is_logged_in"] = True
-        st.session_state["current_user"] = self.username
+        st.session_state["current_user"] = user_info.get("username", self.username)
         st.session_state["current_role"] = user_info.get("role", "customer")
         st.session_state["user_profile"] = {
             "full_name": user_info.get("full_name", ""),
@@ -1,18 +1,17 @@
 # main.py
 
+import importlib
+import uuid
+
 import streamlit as st
 
-from utils import User, StreamlitHelper
-from landing import LandingPage
-from signup import SignupPage
-from login import LoginPage
-from dashboard import welcome_page
-from orders import OrderUI  # ✅ FIX: replaced 'place_order' with correct class import
+from querylog import QueryLog
+from tracing import Tracer
+from utils import ReadRouter, StreamlitHelper
 
 class SessionManager:
     def __init__(self):
         self.defaults = {
-            "user_data": User.load_users(),
             "is_logged_in": False,
             "current_user": "",
             "current_page": "landing",
@@ -28,37 +27,62 @@ class SessionManager:
                 st.session_state[key] = value
 
 class AppController:
+    # Page modules are imported the first time they are routed to, so a cold
+    # start only pays for the page actually shown
+    PAGES = {
+        "landing": ("landing", "LandingPage"),
+        "login": ("login", "LoginPage"),
+        "signup": ("signup", "SignupPage"),
+        "order": ("orders", "OrderUI"),
+        "dashboard": ("dashboard", "DashboardController"),
+    }
+
     def __init__(self):
         self.session = SessionManager()
         self.session.initialize()
         self.page = st.session_state.get("current_page", "landing")
         self.logged_in = st.session_state.get("is_logged_in", False)
 
+    @staticmethod
+    def load_page(name: str):
+        """Return the page class registered under ``name``, importing its module on demand."""
+        module_name, attr = AppController.PAGES[name]
+        return getattr(importlib.import_module(module_name), attr)
+
     def route(self):
-        if self.logged_in:
-            self.handle_logged_in_flow()
-        else:
-            self.handle_guest_flow()
+        # Count this rerun's queries against QueryLog.RERUN_QUERY_BUDGET
+        token = QueryLog.begin_rerun(self.page)
+        # Reads follow this browser session's writes to the primary (see ReadRouter)
+        read_token = ReadRouter.bind(st.session_state.setdefault("read_scope", uuid.uuid4().hex))
+        try:
+            with Tracer.trace(f"rerun:{self.page}", page=self.page, logged_in=self.logged_in):
+                if self.logged_in:
+                    self.handle_logged_in_flow()
+                else:
+                    self.handle_guest_flow()
+        finally:
+            ReadRouter.release(read_token)
+            QueryLog.end_rerun(token)
 
     def handle_logged_in_flow(self):
         if self.page == "order":
             username = st.session_state.get("current_user", "guest")
-            OrderUI(username).place_order_page()  # ✅ FIX: use object method call
+            self.load_page("order")(username).place_order_page()
         else:
-            welcome_page()
+            self.load_page("dashboard")().run()
 
     def handle_guest_flow(self):
         if self.page == "landing":
-            LandingPage().show()
+            self.load_page("landing")().show()
         elif self.page == "login":
-            LoginPage().render()
+            self.load_page("login")().render()
             self._page_switcher("signup", "Don’t have an account? Sign Up below 👇", "Go to Sign Up")
         elif self.page == "signup":
-            SignupPage().render()
+            self.load_page("signup")().render()
             self._page_switcher("login", "Already have an account? Login below 🔑", "Go to Login")
         else:
             st.session_state["current_page"] = "landing"
-            LandingPage().show()
+            self.load_page("landing")().show()
 
     def _page_switcher(self, new_page: str, message: str, button_label: str):
         st.info(message)
@@ -2,12 +2,22 @@
 
 import streamlit as st
 from datetime import datetime
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 from dataclasses import dataclass
-from utils import DBHelper  # ✅ FIXED import to match OOP utils.py
+from utils import Catalog, CatalogSnapshot, DBHelper
+from expiry import ExpiryStatus, EXPIRED, EXPIRING, UNKNOWN, status_for
+from cart import Cart
 
 ITEMS_PER_PAGE = 20
 
+# Sort option -> (column, direction); ties are broken by id so keyset
+# cursors are unique.
+SORT_KEYS = {
+    "Name": ("name", "ASC"),
+    "Price": ("price", "ASC"),
+    "Stock": ("stock", "DESC"),
+}
+
 
 @dataclass
 class Medicine:
@@ -22,17 +32,99 @@ class Medicine:
     requires_prescription: bool = False
 
 
+@dataclass(frozen=True)
+class MedicineQuery:
+    search_term: str = ""
+    category: str = "All"
+    in_stock_only: bool = True
+    sort_by: str = "Name"
+
+    def where_clause(self) -> Tuple[str, List[Any]]:
+        """Filters for the SQL paths; ``search_term`` is matched by the catalog's search index."""
+        clauses, params = [], []
+        if self.category != "All":
+            clauses.append("category = %s")
+            params.append(self.category)
+        if self.in_stock_only:
+            clauses.append("stock > 0")
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def count_sql(self) -> Tuple[str, List[Any]]:
+        where, params = self.where_clause()
+        return f"SELECT COUNT(*) AS total FROM medicines{where}", params
+
+    def page_sql(self, limit: int, after: Optional[Tuple[Any, Any]] = None,
+                 offset: int = 0) -> Tuple[str, List[Any]]:
+        """Build the page query; ``after`` is the (sort value, id) seek cursor."""
+        column, direction = SORT_KEYS.get(self.sort_by, SORT_KEYS["Name"])
+        where, params = self.where_clause()
+        if after is not None:
+            op = ">" if direction == "ASC" else "<"
+            seek = f"({column} {op} %s OR ({column} = %s AND id > %s))"
+            where = f"{where} AND {seek}" if where else f" WHERE {seek}"
+            params += [after[0], after[0], after[1]]
+        sql = f"SELECT * FROM medicines{where} ORDER BY {column} {direction}, id ASC LIMIT %s"
+        params.append(limit)
+        if after is None and offset:
+            sql += " OFFSET %s"
+            params.append(offset)
+        return sql, params
+
+    def cursor_for(self, med: Dict[str, Any]) -> Tuple[Any, Any]:
+        column, _ = SORT_KEYS.get(self.sort_by, SORT_KEYS["Name"])
+        return med.get(column), med.get("id")
+
+
 class MedicineManager:
+    def get_catalog(self) -> CatalogSnapshot:
+        return Catalog.snapshot()
+
     def get_all_medicines(self) -> List[Dict[str, Any]]:
-        return DBHelper.fetch_all("SELECT * FROM medicines")
+        return list(self.get_catalog().medicines)
+
+    def expiry_status(self, med: Dict[str, Any], today: Optional[datetime.date] = None) -> ExpiryStatus:
+        """Precomputed expiry status from the catalog snapshot (parsed once per load)."""
+        status = self.get_catalog().expiry.lookup(med.get("id"), today)
+        return status if status is not None else status_for(med.get("expiry_date"), today)
 
     def is_expired(self, med: Dict[str, Any], today: Optional[datetime.date] = None) -> bool:
-        today = today or datetime.today().date()
-        try:
-            expiry = datetime.strptime(str(med["expiry_date"]), "%Y-%m-%d").date()
-            return expiry < today
-        except Exception:
-            return False
+        return self.expiry_status(med, today).status == EXPIRED
+
+    def count_medicines(self, query: MedicineQuery) -> int:
+        sql, params = query.count_sql()
+        row = DBHelper.fetch_one(sql, params)
+        return int(row["total"]) if row else 0
+
+    def fetch_medicines_page(
+        self,
+        query: MedicineQuery,
+        limit: int = ITEMS_PER_PAGE,
+        after: Optional[Tuple[Any, Any]] = None,
+        offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        sql, params = query.page_sql(limit, after=after, offset=offset)
+        return DBHelper.fetch_all(sql, params)
+
+    def search_medicines(self, query: MedicineQuery) -> List[Dict[str, Any]]:
+        """Rank catalog rows against the search term using the snapshot's index."""
+        catalog = self.get_catalog()
+        results = []
+        for med_id, _score in catalog.search_index.search(query.search_term):
+            med = catalog.by_id.get(med_id)
+            if med is None:
+                continue
+            if query.category != "All" and med.get("category") != query.category:
+                continue
+            if query.in_stock_only and med.get("stock", 0) <= 0:
+                continue
+            results.append(med)
+
+        # "Relevance" keeps the ranking; other keys re-sort (stably) by column
+        if query.sort_by in SORT_KEYS:
+            column, direction = SORT_KEYS[query.sort_by]
+            default = "" if column == "name" else 0
+            results.sort(key=lambda m: m.get(column) or default, reverse=direction == "DESC")
+        return results
 
     def filter_medicines(
         self,
@@ -56,13 +148,17 @@ class MedicineManager:
 class MedicineUI:
     def __init__(self, show_expiry=False):
         self.manager = MedicineManager()
-        self.medicines = self.manager.get_all_medicines()
-        self.filtered: List[Dict[str, Any]] = []
+        self.catalog = self.manager.get_catalog()
+        self.medicines = self.catalog.medicines
+        self.query = MedicineQuery()
+        self.results: Optional[List[Dict[str, Any]]] = None
+        self.prefetched: Optional[Tuple[int, List[Dict[str, Any]]]] = None
+        self.total = 0
         self.page = 0
         self.search_term = ""
         self.category = "All"
         self.in_stock_only = True
-        self.sort_by = "Name"
+        self.sort_by = "Relevance"
         self.show_expiry = show_expiry
 
     def draw_filters(self):
@@ -73,41 +169,87 @@ class MedicineUI:
         with col2:
             st.button("🔄 Refresh")
 
-        categories = sorted({med.get("category", "Other") for med in self.medicines})
+        categories = list(self.catalog.categories)
         col1, col2, col3 = st.columns(3)
         with col1:
             self.category = st.selectbox("Category", ["All"] + categories)
         with col2:
             self.in_stock_only = st.checkbox("In Stock Only", True)
         with col3:
-            self.sort_by = st.selectbox("Sort By", ["Name", "Price", "Stock"])
+            self.sort_by = st.selectbox("Sort By", ["Relevance", "Name", "Price", "Stock"])
 
     def apply_filters_and_sorting(self):
-        self.filtered = self.manager.filter_medicines(
-            self.medicines,
-            search_term=self.search_term,
+        self.query = MedicineQuery(
+            search_term=self.search_term.strip(),
             category=self.category,
-            in_stock_only=self.in_stock_only
+            in_stock_only=self.in_stock_only,
+            sort_by=self.sort_by
         )
-        if self.sort_by == "Price":
-            self.filtered.sort(key=lambda m: m.get("price", 0))
-        elif self.sort_by == "Stock":
-            self.filtered.sort(key=lambda m: m.get("stock", 0), reverse=True)
+        self.prefetched = None
+        if self.query.search_term:
+            self.results = self.manager.search_medicines(self.query)
+            self.total = len(self.results)
+            return
+
+        # The count and the selected page are independent reads: run them together
+        self.results = None
+        self.page_cursors()  # new filters reset the cursors and go back to page 1
+        page = st.session_state.get("medicine_page", 1) - 1
+        count_sql, count_params = self.query.count_sql()
+        fetched = DBHelper.fetch_many({
+            "count": (count_sql, count_params, "one"),
+            "page": self.page_sql(page),
+        })
+        for result in fetched.values():
+            if not result.ok:
+                raise result.error
+        count = fetched["count"].rows
+        self.total = int(count["total"]) if count else 0
+        self.prefetched = (page, fetched["page"].rows)
+
+    def page_cursors(self) -> Dict[int, Any]:
+        """Seek cursors for pages already visited with the current filters."""
+        state = st.session_state.get("medicine_page_cursors")
+        if not state or state["query"] != self.query:
+            state = {"query": self.query, "cursors": {0: None}}
+            st.session_state["medicine_page_cursors"] = state
+            st.session_state["medicine_page"] = 1
+        return state["cursors"]
+
+    def page_sql(self, page: int) -> Tuple[str, List[Any]]:
+        cursors = self.page_cursors()
+        if page in cursors:
+            return self.query.page_sql(ITEMS_PER_PAGE, after=cursors[page])
+        # Jumped ahead of any known cursor: fall back to OFFSET once
+        return self.query.page_sql(ITEMS_PER_PAGE, offset=page * ITEMS_PER_PAGE)
+
+    def fetch_page(self, page: int) -> List[Dict[str, Any]]:
+        if self.results is not None:
+            return self.results[page * ITEMS_PER_PAGE:(page + 1) * ITEMS_PER_PAGE]
+
+        if self.prefetched is not None and self.prefetched[0] == page:
+            rows = self.prefetched[1]
         else:
-            self.filtered.sort(key=lambda m: m.get("name", ""))
+            rows = DBHelper.fetch_all(*self.page_sql(page))
+        if len(rows) == ITEMS_PER_PAGE:
+            self.page_cursors()[page + 1] = self.query.cursor_for(rows[-1])
+        return rows
 
     def display_pagination(self):
-        st.markdown(f"**{len(self.filtered)} medicine(s) found**")
-        if not self.filtered:
+        st.markdown(f"**{self.total} medicine(s) found**")
+        if not self.total:
             st.info("No matching results.")
             return []
 
-        total_pages = (len(self.filtered) + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE
-        self.page = st.selectbox("Page", range(1, total_pages + 1), index=0) - 1
-        return self.filtered[self.page * ITEMS_PER_PAGE:(self.page + 1) * ITEMS_PER_PAGE]
+        total_pages = (self.total + ITEMS_PER_PAGE - 1) // ITEMS_PER_PAGE
+        if st.session_state.get("medicine_page", 1) > total_pages:
+            st.session_state["medicine_page"] = 1
+        self.page = st.selectbox("Page", range(1, total_pages + 1), key="medicine_page") - 1
+        return self.fetch_page(self.page)
 
     def draw_medicine_card(self, med: Dict[str, Any]):
-        expired = self.manager.is_expired(med)
+        expiry = self.manager.expiry_status(med)
+        expired = expiry.status == EXPIRED
         key = f"qty_{med.get('id', med.get('name', 'unknown'))}"
         default_qty = st.session_state.get("cart_quantities", {}).get(key, 0)
 
@@ -134,18 +276,14 @@ class MedicineUI:
         if med.get("requires_prescription"):
             st.warning("⚠️ Requires prescription")
 
-        expiry_string = med.get("expiry_date", "N/A")
-        try:
-            expiry = datetime.strptime(expiry_string, "%Y-%m-%d").date()
-            days_left = (expiry - datetime.today().date()).days
-            if expired:
-                st.error("❌ Medicine not available")
-            elif self.show_expiry or days_left <= 30:
-                st.warning(f"⚠️ Expires in {days_left} days ({expiry})")
-            else:
-                st.caption(f"Expiry: {expiry}")
-        except Exception:
-            st.caption(f"Expiry: {expiry_string}")
+        if expiry.status == UNKNOWN:
+            st.caption(f"Expiry: {med.get('expiry_date', 'N/A')}")
+        elif expired:
+            st.error("❌ Medicine not available")
+        elif self.show_expiry or expiry.status == EXPIRING:
+            st.warning(f"⚠️ Expires in {expiry.days_left} days ({expiry.expiry_date})")
+        else:
+            st.caption(f"Expiry: {expiry.expiry_date}")
 
         st.markdown("---")
 
@@ -166,7 +304,9 @@ class MedicineUI:
                 })
 
         if added_items:
-            st.session_state.setdefault("cart", []).extend(added_items)
+            cart = Cart.current()
+            for item in added_items:
+                cart.add(item)  # merges into an existing line for the same medicine
             st.success(f"🛒 Added {len(added_items)} item(s) to cart!")
         else:
             st.warning("⚠️ Please select at least one item with quantity.")
@@ -177,7 +317,14 @@ class MedicineUI:
             st.session_state.get("cart_quantities", {}).pop(key, None)
         st.experimental_rerun()
 
+    def check_catalog_version(self):
+        seen = st.session_state.get("catalog_version")
+        if seen is not None and seen != self.catalog.version:
+            st.info("🔄 The medicine catalog has been updated.")
+        st.session_state["catalog_version"] = self.catalog.version
+
     def show(self):
+        self.check_catalog_version()
         if not self.medicines:
             st.warning("No medicines available.")
             return
@@ -199,11 +346,7 @@ class MedicineUI:
                     self.clear_selections(meds_page)
 
 
-# Usage
-if __name__ == "__main__" or st.session_state.get("current_page") == "medicines":
-    ui = MedicineUI(show_expiry=False)
-    ui.show()
-
-elif st.session_state.get("current_page") == "enhanced_medicines":
-    ui = MedicineUI(show_expiry=True)
+# Usage: streamlit run medicines.py (importing this module has no side effects)
+if __name__ == "__main__":
+    ui = MedicineUI(show_expiry=st.session_state.get("current_page") == "enhanced_medicines")
     ui.show()
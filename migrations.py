@@ -0,0 +1,363 @@
+# migrations.py
+
+import argparse
+import logging
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Sequence
+
+from utils import DBHelper, ShardRouter, UnitOfWork
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = "medicare_schema_migrations"
+LOCK_TIMEOUT = 30
+
+# -------------------------------
+# 🔍 Schema Introspection
+# -------------------------------
+def table_exists(uow, table):
+    return uow.fetch_one("""
+        SELECT 1 AS found FROM information_schema.tables
+        WHERE table_schema = DATABASE() AND table_name = %s
+    """, (table,)) is not None
+
+
+def column_exists(uow, table, column):
+    return uow.fetch_one("""
+        SELECT 1 AS found FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (table, column)) is not None
+
+
+def index_covers(uow, table, columns):
+    """Tell whether some index on ``table`` starts with ``columns`` in order."""
+    rows = uow.fetch_all("""
+        SELECT index_name, column_name, seq_in_index FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s
+        ORDER BY index_name, seq_in_index
+    """, (table,))
+    indexes = {}
+    for row in rows:
+        indexes.setdefault(row['index_name'], []).append(row['column_name'].lower())
+    wanted = [column.lower() for column in columns]
+    return any(cols[:len(wanted)] == wanted for cols in indexes.values())
+
+# -------------------------------
+# 🧱 Idempotent Steps
+# -------------------------------
+# Every step checks the live schema first, so a migration that was cut
+# short (MySQL commits DDL implicitly) can simply be run again.
+
+def run_sql(sql):
+    def step(uow):
+        uow.execute(sql)
+    return step
+
+
+def add_column(table, column, definition):
+    def step(uow):
+        if not column_exists(uow, table, column):
+            uow.execute(f"ALTER TABLE `{table}` ADD COLUMN `{column}` {definition}")
+    return step
+
+
+def rename_column(table, old, new, definition):
+    def step(uow):
+        if column_exists(uow, table, old) and not column_exists(uow, table, new):
+            uow.execute(f"ALTER TABLE `{table}` CHANGE COLUMN `{old}` `{new}` {definition}")
+    return step
+
+
+def add_index(table, name, columns, unique=False):
+    def step(uow):
+        if not index_covers(uow, table, columns):
+            kind = "UNIQUE INDEX" if unique else "INDEX"
+            column_list = ", ".join(f"`{column}`" for column in columns)
+            uow.execute(f"ALTER TABLE `{table}` ADD {kind} `{name}` ({column_list})")
+    return step
+
+
+def when_column_exists(table, column, sql):
+    def step(uow):
+        if column_exists(uow, table, column):
+            uow.execute(sql)
+    return step
+
+# -------------------------------
+# 📜 Migrations
+# -------------------------------
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    description: str
+    steps: Sequence[Callable]
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "Create tables in the shape utils.py uses", [
+        run_sql("""
+            CREATE TABLE IF NOT EXISTS users (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                username VARCHAR(50) COLLATE utf8mb4_general_ci NOT NULL,
+                email VARCHAR(100) COLLATE utf8mb4_general_ci,
+                password VARCHAR(255),
+                role VARCHAR(20) DEFAULT 'user'
+            )
+        """),
+        run_sql("""
+            CREATE TABLE IF NOT EXISTS medicines (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                name VARCHAR(100),
+                description TEXT,
+                category VARCHAR(50),
+                price DECIMAL(10,2),
+                stock INT,
+                expiry_date DATE,
+                manufacturer VARCHAR(100),
+                requires_prescription BOOLEAN DEFAULT FALSE
+            )
+        """),
+        run_sql("""
+            CREATE TABLE IF NOT EXISTS orders (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user VARCHAR(50),
+                total DECIMAL(10,2),
+                address TEXT,
+                datetime DATETIME DEFAULT CURRENT_TIMESTAMP,
+                status ENUM('pending','delivered','cancelled') DEFAULT 'pending'
+            )
+        """),
+        run_sql("""
+            CREATE TABLE IF NOT EXISTS order_items (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                order_id INT,
+                medicine_id INT,
+                medicine_name VARCHAR(100),
+                qty INT,
+                price DECIMAL(10,2),
+                expiry_date DATE
+            )
+        """),
+        run_sql("""
+            CREATE TABLE IF NOT EXISTS consultations (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user VARCHAR(50),
+                symptoms TEXT,
+                preferred_time VARCHAR(100),
+                datetime DATETIME DEFAULT CURRENT_TIMESTAMP,
+                status ENUM('pending', 'completed') DEFAULT 'pending'
+            )
+        """),
+    ]),
+    Migration(2, "Align tables created by the legacy mysql script with the code", [
+        # users: username login column, 'user' role used by signup
+        add_column("users", "username", "VARCHAR(50) COLLATE utf8mb4_general_ci NULL AFTER id"),
+        when_column_exists("users", "name", """
+            UPDATE users SET username = COALESCE(name, email) WHERE username IS NULL
+        """),
+        run_sql("UPDATE users SET username = CONCAT('user', id) WHERE username IS NULL"),
+        run_sql("ALTER TABLE users MODIFY username VARCHAR(50) COLLATE utf8mb4_general_ci NOT NULL"),
+        run_sql("ALTER TABLE users MODIFY email VARCHAR(100) COLLATE utf8mb4_general_ci"),
+        run_sql("ALTER TABLE users MODIFY role VARCHAR(20) DEFAULT 'user'"),
+        # medicines
+        rename_column("medicines", "prescription_required", "requires_prescription",
+                      "BOOLEAN DEFAULT FALSE"),
+        add_column("medicines", "manufacturer", "VARCHAR(100) NULL"),
+        # orders: username-keyed, with address and datetime
+        add_column("orders", "user", "VARCHAR(50) NULL AFTER id"),
+        when_column_exists("orders", "user_id", """
+            UPDATE orders o JOIN users u ON o.user_id = u.id
+            SET o.user = u.username WHERE o.user IS NULL
+        """),
+        add_column("orders", "address", "TEXT NULL"),
+        rename_column("orders", "order_date", "datetime", "DATETIME DEFAULT CURRENT_TIMESTAMP"),
+        # order_items
+        rename_column("order_items", "quantity", "qty", "INT"),
+        add_column("order_items", "medicine_name", "VARCHAR(100) NULL"),
+        add_column("order_items", "expiry_date", "DATE NULL"),
+        # consultations: username-keyed, symptoms + preferred time
+        add_column("consultations", "user", "VARCHAR(50) NULL AFTER id"),
+        when_column_exists("consultations", "user_id", """
+            UPDATE consultations c JOIN users u ON c.user_id = u.id
+            SET c.user = u.username WHERE c.user IS NULL
+        """),
+        rename_column("consultations", "message", "symptoms", "TEXT"),
+        rename_column("consultations", "consultation_date", "datetime",
+                      "DATETIME DEFAULT CURRENT_TIMESTAMP"),
+        add_column("consultations", "preferred_time", "VARCHAR(100) NULL"),
+    ]),
+    Migration(3, "Index the login, history and catalog queries", [
+        add_index("users", "uq_users_username", ["username"], unique=True),
+        add_index("users", "uq_users_email", ["email"], unique=True),
+        add_index("orders", "idx_orders_user_datetime", ["user", "datetime"]),
+        add_index("consultations", "idx_consultations_user_datetime", ["user", "datetime"]),
+        add_index("order_items", "idx_order_items_order", ["order_id"]),
+        add_index("medicines", "idx_medicines_category_name", ["category", "name"]),
+    ]),
+    Migration(4, "Key the cart table by username for server-side carts", [
+        run_sql("""
+            CREATE TABLE IF NOT EXISTS cart (
+                id INT AUTO_INCREMENT PRIMARY KEY,
+                user VARCHAR(50) NOT NULL,
+                medicine_id INT NOT NULL,
+                quantity INT NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+        """),
+        # legacy script: user_id-keyed rows
+        add_column("cart", "user", "VARCHAR(50) NULL AFTER id"),
+        when_column_exists("cart", "user_id", """
+            UPDATE cart c JOIN users u ON c.user_id = u.id
+            SET c.user = u.username WHERE c.user IS NULL
+        """),
+        run_sql("DELETE FROM cart WHERE user IS NULL OR medicine_id IS NULL"),
+        add_column("cart", "updated_at",
+                   "TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP"),
+        # one row per (user, medicine): keep the newest duplicate
+        run_sql("""
+            DELETE older FROM cart older
+            JOIN cart newer ON newer.user = older.user
+                AND newer.medicine_id = older.medicine_id AND newer.id > older.id
+        """),
+        add_index("cart", "uq_cart_user_medicine", ["user", "medicine_id"], unique=True),
+    ]),
+    Migration(5, "Add sales rollup tables (run `python reporting.py rebuild` to backfill)", [
+        run_sql("""
+            CREATE TABLE IF NOT EXISTS sales_daily (
+                day DATE PRIMARY KEY,
+                orders INT NOT NULL DEFAULT 0,
+                units INT NOT NULL DEFAULT 0,
+                revenue DECIMAL(14,2) NOT NULL DEFAULT 0
+            )
+        """),
+        run_sql("""
+            CREATE TABLE IF NOT EXISTS sales_daily_medicine (
+                day DATE NOT NULL,
+                medicine_id INT NOT NULL,
+                medicine_name VARCHAR(100),
+                orders INT NOT NULL DEFAULT 0,
+                units INT NOT NULL DEFAULT 0,
+                revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, medicine_id)
+            )
+        """),
+        run_sql("""
+            CREATE TABLE IF NOT EXISTS sales_daily_category (
+                day DATE NOT NULL,
+                category VARCHAR(50) NOT NULL,
+                orders INT NOT NULL DEFAULT 0,
+                units INT NOT NULL DEFAULT 0,
+                revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, category)
+            )
+        """),
+        # rebuild windows scan orders by date
+        add_index("orders", "idx_orders_datetime", ["datetime"]),
+    ]),
+    Migration(6, "Add the shard directory (per-user shard overrides)", [
+        run_sql("""
+            CREATE TABLE IF NOT EXISTS shard_directory (
+                username VARCHAR(50) COLLATE utf8mb4_general_ci PRIMARY KEY,
+                shard VARCHAR(50) NOT NULL,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+            )
+        """),
+    ]),
+    Migration(7, "Add idempotency keys to orders for the order queue (run with --shards)", [
+        add_column("orders", "request_key", "VARCHAR(64) NULL"),
+        add_index("orders", "uq_orders_request_key", ["request_key"], unique=True),
+    ]),
+]
+
+# -------------------------------
+# 🚀 Runner
+# -------------------------------
+class MigrationRunner:
+    """Applies pending migrations in version order and records them.
+
+    ``shard`` migrates one of ``DBConfig.SHARDS`` instead of the primary;
+    every shard gets the full schema, though only the per-user tables are
+    used there.
+    """
+
+    def __init__(self, migrations: Sequence[Migration] = None, shard: Optional[str] = None):
+        self.migrations = sorted(migrations or MIGRATIONS, key=lambda m: m.version)
+        self.shard = shard
+
+    def ensure_history_table(self):
+        with UnitOfWork(self.shard) as uow:
+            uow.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INT PRIMARY KEY,
+                    description VARCHAR(255),
+                    applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+
+    def applied_versions(self):
+        with UnitOfWork(self.shard) as uow:
+            return {row['version'] for row in uow.fetch_all("SELECT version FROM schema_migrations")}
+
+    def pending(self):
+        applied = self.applied_versions()
+        return [m for m in self.migrations if m.version not in applied]
+
+    def run(self, target=None):
+        """Apply every pending migration up to ``target``; return the versions applied."""
+        self.ensure_history_table()
+        applied = []
+        # A named lock keeps two app instances from migrating at once
+        with ShardRouter.connection(self.shard) as lock_conn:
+            with lock_conn.cursor() as cursor:
+                DBHelper.run(cursor, "SELECT GET_LOCK(%s, %s) AS locked", (LOCK_NAME, LOCK_TIMEOUT))
+                if not (cursor.fetchone() or {}).get('locked'):
+                    raise RuntimeError("Another process is running schema migrations.")
+                try:
+                    for migration in self.pending():
+                        if target is not None and migration.version > target:
+                            break
+                        self.apply(migration)
+                        applied.append(migration.version)
+                finally:
+                    DBHelper.run(cursor, "SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        return applied
+
+    def apply(self, migration):
+        logger.info("Applying migration %s%s: %s", migration.version,
+                    f" on shard {self.shard}" if self.shard else "", migration.description)
+        with UnitOfWork(self.shard) as uow:
+            for step in migration.steps:
+                step(uow)
+            uow.execute(
+                "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                (migration.version, migration.description)
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply MediCare schema migrations.")
+    parser.add_argument("--status", action="store_true", help="list pending migrations and exit")
+    parser.add_argument("--target", type=int, help="stop after this version")
+    parser.add_argument("--shards", action="store_true", help="also migrate every configured shard")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    databases = [None] + (ShardRouter.names() if args.shards else [])
+    for shard in databases:
+        label = f"Shard {shard}: " if shard else ""
+        runner = MigrationRunner(shard=shard)
+        if args.status:
+            runner.ensure_history_table()
+            pending = runner.pending()
+            for migration in pending:
+                print(f"{label}pending  {migration.version:>4}  {migration.description}")
+            if not pending:
+                print(f"{label}Schema is up to date.")
+            continue
+
+        applied = runner.run(target=args.target)
+        print(label + (f"Applied {len(applied)} migration(s)." if applied else "Schema is up to date."))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+# order_queue.py
+
+import atexit
+import logging
+import queue
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from utils import InsufficientStockError, Order, ReadRouter, ShardRouter, UnitOfWork
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+PLACED = "placed"
+REJECTED = "rejected"  # not enough stock; ``short`` lists the lines
+FAILED = "failed"
+
+
+class QueueFullError(Exception):
+    """Raised when the order queue is at capacity; the caller should retry shortly."""
+
+
+@dataclass
+class OrderTicket:
+    """The pending reference handed back for a submitted order, and its outcome."""
+    reference: str
+    order: Dict[str, Any] = field(repr=False)
+    state: str = PENDING
+    order_id: Optional[int] = None
+    error: Optional[str] = None
+    short: List[Dict[str, Any]] = field(default_factory=list)
+    submitted_at: float = field(default_factory=time.monotonic)
+    finished_at: Optional[float] = None
+    read_scope: Optional[str] = None  # the submitting session, pinned to the primary once placed
+
+    @property
+    def done(self):
+        return self.state != PENDING
+
+
+class OrderQueue:
+    """Accepts orders at once and writes them on a small pool of worker threads.
+
+    ``submit()`` validates an order and queues it under its idempotency
+    key, which doubles as the pending reference for ``status()``;
+    submitting the same key again returns the same ticket instead of a
+    second order (a failed one is queued again), and the key is stored
+    with the order, so not even a retried write can place it twice. At
+    most ``MAX_PENDING`` orders wait; beyond that ``submit()`` raises
+    QueueFullError.
+
+    Each worker takes up to ``BATCH_SIZE`` orders and writes them in one
+    transaction with a savepoint per order, so an order short on stock is
+    rolled back alone. If the batch itself fails, its orders are retried
+    one at a time. Orders of sharded users are always written one at a
+    time (see ``Order.insert_order``). Once an order is placed, the
+    submitting session's reads are pinned to the primary as if it had
+    written the order itself. Tickets are kept for ``RESULT_TTL`` seconds
+    after they finish.
+
+    The queue and the tickets live only in this process's memory. At exit
+    ``drain()`` waits up to ``SHUTDOWN_TIMEOUT`` seconds for queued orders;
+    whatever is still queued after that, or when the process is killed,
+    is lost. Such an order was never written, so the customer can submit
+    it again.
+    """
+    MAX_PENDING = 200
+    WORKERS = 2
+    BATCH_SIZE = 20
+    BATCH_WAIT = 0.05  # seconds a worker waits to fill a batch after the first order
+    RESULT_TTL = 600
+    SHUTDOWN_TIMEOUT = 10
+
+    _queue: Optional[queue.Queue] = None
+    _tickets: Dict[str, OrderTicket] = {}
+    _lock = threading.Lock()
+    _workers: List[threading.Thread] = []
+
+    @staticmethod
+    def new_key():
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def submit(order, key=None):
+        """Queue ``order`` and return its reference (the idempotency key).
+
+        The session scope bound by the caller (see ``ReadRouter.bind``) goes
+        with the ticket, so the worker can pin that session once it writes.
+        """
+        OrderQueue.validate(order)
+        key = key or OrderQueue.new_key()
+        with OrderQueue._lock:
+            OrderQueue._expire()
+            existing = OrderQueue._tickets.get(key)
+            if existing is not None and existing.state != FAILED:
+                return key
+            if OrderQueue._queue is None:
+                OrderQueue._queue = queue.Queue(maxsize=OrderQueue.MAX_PENDING)
+            ticket = OrderTicket(key, dict(order, request_key=key), read_scope=ReadRouter.scope())
+            try:
+                OrderQueue._queue.put_nowait(ticket)
+            except queue.Full:
+                raise QueueFullError(
+                    f"{OrderQueue.MAX_PENDING} orders are already waiting; please try again shortly."
+                )
+            OrderQueue._tickets[key] = ticket
+            OrderQueue._start_workers()
+        return key
+
+    @staticmethod
+    def status(reference) -> Optional[OrderTicket]:
+        """The ticket for a reference, or None once it expired (or was never submitted here)."""
+        return OrderQueue._tickets.get(reference)
+
+    @staticmethod
+    def pending_count():
+        return OrderQueue._queue.qsize() if OrderQueue._queue is not None else 0
+
+    @staticmethod
+    def validate(order):
+        if not str(order.get('user') or "").strip():
+            raise ValueError("An order needs a user.")
+        if not str(order.get('address') or "").strip():
+            raise ValueError("An order needs a delivery address.")
+        items = order.get('items') or []
+        if not items:
+            raise ValueError("An order needs at least one item.")
+        if any(int(item.get('qty') or 0) <= 0 for item in items):
+            raise ValueError("Every order line needs a positive quantity.")
+
+    @staticmethod
+    def drain(timeout=None):
+        """Wait until every queued order has been written; False on timeout."""
+        deadline = time.monotonic() + (OrderQueue.SHUTDOWN_TIMEOUT if timeout is None else timeout)
+        while OrderQueue._queue is not None and OrderQueue._queue.unfinished_tasks:
+            if time.monotonic() >= deadline:
+                logger.warning("Exiting with %d queued order(s) unwritten",
+                               OrderQueue._queue.unfinished_tasks)
+                return False
+            time.sleep(0.05)
+        return True
+
+    @staticmethod
+    def _start_workers():
+        # Caller holds _lock
+        if OrderQueue._workers:
+            return
+        for i in range(OrderQueue.WORKERS):
+            worker = threading.Thread(target=OrderQueue._run, name=f"order-writer-{i}", daemon=True)
+            worker.start()
+            OrderQueue._workers.append(worker)
+        atexit.register(OrderQueue.drain)
+
+    @staticmethod
+    def _expire():
+        # Caller holds _lock
+        cutoff = time.monotonic() - OrderQueue.RESULT_TTL
+        for key in [key for key, ticket in OrderQueue._tickets.items()
+                    if ticket.finished_at is not None and ticket.finished_at < cutoff]:
+            del OrderQueue._tickets[key]
+
+    @staticmethod
+    def _run():
+        while True:
+            batch = OrderQueue._take_batch()
+            try:
+                OrderQueue._process(batch)
+            except Exception:
+                logger.exception("Order worker failed on a batch of %d", len(batch))
+                for ticket in batch:
+                    if not ticket.done:
+                        OrderQueue._finish(ticket, error=RuntimeError("The order could not be written."))
+            finally:
+                for _ in batch:
+                    OrderQueue._queue.task_done()
+
+    @staticmethod
+    def _take_batch():
+        batch = [OrderQueue._queue.get()]
+        deadline = time.monotonic() + OrderQueue.BATCH_WAIT
+        while len(batch) < OrderQueue.BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(OrderQueue._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    @staticmethod
+    def _process(batch):
+        local = []
+        for ticket in batch:
+            if ShardRouter.shard_for(ticket.order['user']) is None:
+                local.append(ticket)
+            else:
+                OrderQueue._place_one(ticket)
+        if len(local) == 1:
+            OrderQueue._place_one(local[0])
+        elif local:
+            OrderQueue._place_batch(local)
+
+    @staticmethod
+    def _place_batch(tickets):
+        results = []
+        try:
+            with UnitOfWork() as uow:
+                for ticket in tickets:
+                    uow.execute("SAVEPOINT queued_order")
+                    try:
+                        order_id = Order.place(uow, ticket.order)
+                    except Exception as e:
+                        if not isinstance(e, InsufficientStockError) and not Order.is_duplicate_request(e):
+                            raise
+                        uow.execute("ROLLBACK TO SAVEPOINT queued_order")
+                        results.append((ticket, None, e))
+                    else:
+                        uow.execute("RELEASE SAVEPOINT queued_order")
+                        results.append((ticket, order_id, None))
+        except Exception:
+            # e.g. a deadlock between workers: the request keys make one-by-one retries safe
+            logger.warning("Order batch of %d failed; writing them one at a time",
+                           len(tickets), exc_info=True)
+            for ticket in tickets:
+                OrderQueue._place_one(ticket)
+            return
+        for ticket, order_id, error in results:
+            if isinstance(error, InsufficientStockError):
+                error.short = Order.find_short_lines(error.requested)
+            OrderQueue._finish(ticket, order_id, error)
+
+    @staticmethod
+    def _place_one(ticket):
+        try:
+            order_id = Order.insert_order(ticket.order)
+        except Exception as e:
+            if not isinstance(e, InsufficientStockError) and not Order.is_duplicate_request(e):
+                logger.exception("Could not write queued order %s", ticket.reference)
+            OrderQueue._finish(ticket, error=e)
+        else:
+            OrderQueue._finish(ticket, order_id)
+
+    @staticmethod
+    def _finish(ticket, order_id=None, error=None):
+        if error is not None and Order.is_duplicate_request(error):
+            # Written by an earlier attempt: report that order
+            order_id = Order.find_by_request_key(ticket.order['user'], ticket.reference)
+            error = None if order_id else error
+        with OrderQueue._lock:
+            if error is None:
+                ticket.state, ticket.order_id = PLACED, order_id
+            elif isinstance(error, InsufficientStockError):
+                ticket.state, ticket.short, ticket.error = REJECTED, error.short, str(error)
+            else:
+                ticket.state, ticket.error = FAILED, "The order could not be placed. Please try again."
+            ticket.finished_at = time.monotonic()
+        if ticket.state == PLACED and ticket.read_scope is not None:
+            # The worker wrote on the submitter's behalf: pin that session, not this thread's
+            token = ReadRouter.bind(ticket.read_scope)
+            try:
+                ReadRouter.note_write()
+            finally:
+                ReadRouter.release(token)
@@ -1,12 +1,14 @@
 # orders.py
 import streamlit as st
 from datetime import datetime
-from utils import Order as OrderManager
+from utils import Order as OrderManager, CartStore
+from cart import Cart
+from order_queue import OrderQueue, QueueFullError, PLACED, REJECTED
 
 class OrderUI:
     def __init__(self, username):
         self.username = username
-        self.cart = st.session_state.get("cart", [])
+        self.cart = Cart.current()
         self.total = 0
         self.address = st.session_state.get("address", "")
 
@@ -22,7 +24,7 @@ class OrderUI:
 
     def render_order_summary(self):
         st.subheader("🧾 Order Summary")
-        self.total = sum(item["price"] * item["qty"] for item in self.cart)
+        self.total = self.cart.total_amount
         for item in self.cart:
             st.write(
                 f"- {item['name']} (x{item['qty']} @ ₹{item['price']}/unit) = ₹{item['qty'] * item['price']}"
@@ -44,21 +46,63 @@ class OrderUI:
             "address": self.address.strip(),
             "total": self.total,
             "datetime": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "items": self.cart
+            "items": [dict(item) for item in self.cart]  # a snapshot: the cart may change while queued
         }
 
-        order_id = OrderManager.insert_order(order)
-        if order_id:
-            st.success(f"✅ Order #{order_id} placed successfully!")
-            st.session_state["cart"] = []
+        # One key per checkout: a double click or a retry cannot place the order twice
+        key = st.session_state.setdefault("order_request_key", OrderQueue.new_key())
+        try:
+            st.session_state["pending_order"] = OrderQueue.submit(order, key)
+        except QueueFullError:
+            st.warning("⏳ We are receiving a lot of orders right now. Please try again in a moment.")
+            return
+        except ValueError as e:
+            st.warning(f"⚠️ {e}")
+            return
+        st.rerun()
+
+    def handle_order_result(self, ticket):
+        st.session_state.pop("pending_order", None)
+        if ticket is None:
+            st.warning("⚠️ We could not confirm your last order. Please check Your Orders before ordering again.")
+            return
+
+        if ticket.state == PLACED:
+            st.success(f"✅ Order #{ticket.order_id} placed successfully!")
+            st.session_state.pop("order_request_key", None)
+            self.cart.clear()
+            CartStore.flush(self.username)  # the emptied cart is saved before we move on
             st.session_state["cart_quantities"] = {}
             st.session_state["dashboard_menu_selected"] = 2
             st.session_state["current_page"] = "dashboard"
             st.rerun()
+        elif ticket.state == REJECTED:
+            st.session_state.pop("order_request_key", None)
+            st.error("❌ Some items no longer have enough stock:")
+            for line in ticket.short:
+                st.write(f"- {line['name']}: requested {line['requested']}, available {line['available']}")
         else:
             st.error("❌ Failed to place order. Please try again later.")
 
+    @staticmethod
+    @st.fragment(run_every=1.0)
+    def await_order(reference):
+        """Poll a queued order; once it is done the whole page reruns to show the outcome."""
+        ticket = OrderQueue.status(reference)
+        if ticket is None or ticket.done:
+            st.rerun()
+        st.info("⏳ Placing your order… this page updates by itself.")
+
     def place_order_page(self):
+        reference = st.session_state.get("pending_order")
+        if reference:
+            ticket = OrderQueue.status(reference)
+            if ticket is not None and not ticket.done:
+                st.header("🛒 Placing Your Order")
+                self.await_order(reference)
+                return
+            self.handle_order_result(ticket)
+
         if self.is_cart_empty():
             self.show_empty_cart_message()
             return
@@ -72,22 +116,43 @@ class OrderUI:
 
     @staticmethod
     def show_user_orders(username):
-        orders = OrderManager.get_user_orders(username)
         st.header("📦 Your Orders")
 
-        if not orders:
+        # Stack of keyset cursors: the last entry starts the page on screen
+        history = st.session_state.get("order_history")
+        if not history or history["user"] != username:
+            history = {"user": username, "cursors": [None]}
+            st.session_state["order_history"] = history
+        cursors = history["cursors"]
+
+        orders, next_cursor = OrderManager.get_user_orders_page(username, before=cursors[-1])
+
+        if not orders and len(cursors) == 1:
             st.info("🛍️ You have no orders yet.")
             return
 
-        for i, order in enumerate(orders, 1):
+        for order in orders:
             st.subheader(f"📌 Order #{order['id']} — {order['datetime']}")
             st.write(f"🏠 Address: {order['address']}")
+            for item in order["items"]:
+                st.write(f"- {item['medicine_name']} (x{item['qty']} @ ₹{item['price']}/unit)")
             st.write(f"💵 Total: ₹{order['total']:.2f}")
             st.markdown("---")
 
+        col1, col2, col3 = st.columns([1, 1, 1])
+        with col1:
+            if len(cursors) > 1:
+                st.button("⬅️ Newer orders", key="orders_newer", on_click=cursors.pop)
+        with col2:
+            st.caption(f"Page {len(cursors)}")
+        with col3:
+            if next_cursor is not None:
+                st.button("Older orders ➡️", key="orders_older",
+                          on_click=cursors.append, args=(next_cursor,))
+
 
-# 👇 Example usage
-if __name__ == "__main__" or st.session_state.get("current_page") in ("order", "orders"):
+# 👇 Example usage (importing this module has no side effects)
+if __name__ == "__main__":
     username = st.session_state.get("username", "guest")
 
     # If ordering page
@@ -0,0 +1,200 @@
+# querylog.py
+
+import bisect
+import contextvars
+import functools
+import logging
+import os
+import re
+import sys
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_COMMENT_RE = re.compile(r"/\*.*?\*/|--[^\n]*|#[^\n]*", re.S)
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_RE = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|%\(\w+\)s")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_VALUES_RE = re.compile(r"\bvalues\s*\(\?\+?\)(?:\s*,\s*\(\?\+?\))*")
+_SPACE_RE = re.compile(r"\s+")
+
+# Modules whose frames are skipped when naming the caller of a query
+_INTERNAL_FILES = {"utils.py", "querylog.py", "tracing.py"}
+
+
+@functools.lru_cache(maxsize=2048)
+def fingerprint(query: str) -> str:
+    """Normalize a statement so calls differing only in values aggregate together.
+
+    Comments and hints are dropped, literals and placeholders become ``?``,
+    ``IN (...)`` lists and multi-row ``VALUES`` collapse to one group.
+    """
+    text = _STRING_RE.sub("?", query)
+    text = _COMMENT_RE.sub(" ", text)
+    text = _PLACEHOLDER_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    text = _SPACE_RE.sub(" ", text).strip().lower()
+    text = _LIST_RE.sub("(?+)", text)
+    return _VALUES_RE.sub("values (?+)", text)
+
+
+def _caller() -> str:
+    frame = sys._getframe(1)
+    while frame is not None and os.path.basename(frame.f_code.co_filename) in _INTERNAL_FILES:
+        frame = frame.f_back
+    if frame is None:
+        return "<unknown>"
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno} in {frame.f_code.co_name}"
+
+# -------------------------------
+# 📊 Latency Histograms
+# -------------------------------
+# Upper bucket bounds in milliseconds; the last bucket is open-ended
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+@dataclass
+class QueryStat:
+    """Aggregated timings for one statement fingerprint."""
+    fingerprint: str
+    count: int = 0
+    errors: int = 0
+    rows: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(BUCKETS_MS) + 1))
+
+    def add(self, elapsed: float, rows: int, error: bool):
+        self.count += 1
+        self.errors += int(error)
+        self.rows += rows
+        self.total += elapsed
+        self.max = max(self.max, elapsed)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, elapsed * 1000)] += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def percentile(self, p: float) -> float:
+        """Estimate the ``p``-th percentile (seconds) as its bucket's upper bound."""
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKETS_MS[i] / 1000, self.max) if i < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def as_dict(self) -> Dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "count": self.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_s": round(self.total, 6),
+            "mean_ms": round(self.mean * 1000, 3),
+            "p50_ms": self.percentile(50) * 1000,
+            "p95_ms": self.percentile(95) * 1000,
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+# -------------------------------
+# 🔁 Per-Rerun Budget
+# -------------------------------
+@dataclass
+class RerunStats:
+    """Queries issued while rendering one page rerun."""
+    page: str
+    count: int = 0
+    total: float = 0.0
+    by_fingerprint: Dict[str, int] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, key: str, elapsed: float):
+        with self.lock:
+            self.count += 1
+            self.total += elapsed
+            self.by_fingerprint[key] = self.by_fingerprint.get(key, 0) + 1
+
+
+_current_rerun: contextvars.ContextVar = contextvars.ContextVar("current_rerun", default=None)
+
+# -------------------------------
+# 📈 Query Log
+# -------------------------------
+class QueryLog:
+    """Process-wide query statistics, slow-query log and per-rerun budget.
+
+    ``record()`` is called for every statement the db layer runs. A query
+    slower than ``SLOW_QUERY_SECONDS`` is logged with the code that issued
+    it; a rerun issuing more than ``RERUN_QUERY_BUDGET`` queries logs a
+    warning when it ends. Queries run on worker threads count towards the
+    rerun whose context submitted them (see ``contextvars.copy_context``).
+    """
+    SLOW_QUERY_SECONDS = 0.5
+    RERUN_QUERY_BUDGET = 25
+    ENABLED = True
+
+    _stats: Dict[str, QueryStat] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def record(query: str, elapsed: float, rows: int = 0, error: bool = False):
+        if not QueryLog.ENABLED:
+            return
+        key = fingerprint(query)
+        with QueryLog._lock:
+            stat = QueryLog._stats.get(key)
+            if stat is None:
+                stat = QueryLog._stats[key] = QueryStat(key)
+            stat.add(elapsed, rows, error)
+
+        rerun = _current_rerun.get()
+        if rerun is not None:
+            rerun.add(key, elapsed)
+
+        if elapsed >= QueryLog.SLOW_QUERY_SECONDS:
+            logger.warning("Slow query (%.1f ms, %d rows) from %s: %s",
+                           elapsed * 1000, rows, _caller(), _SPACE_RE.sub(" ", query).strip())
+
+    @staticmethod
+    def stats(limit: Optional[int] = None) -> List[Dict]:
+        """Aggregates per fingerprint, most total time first."""
+        with QueryLog._lock:
+            stats = sorted(QueryLog._stats.values(), key=lambda s: s.total, reverse=True)
+            rows = [stat.as_dict() for stat in stats]
+        return rows[:limit] if limit else rows
+
+    @staticmethod
+    def reset():
+        with QueryLog._lock:
+            QueryLog._stats.clear()
+
+    @staticmethod
+    def begin_rerun(page: str) -> contextvars.Token:
+        """Start counting the queries of one rerun of ``page``."""
+        return _current_rerun.set(RerunStats(page))
+
+    @staticmethod
+    def end_rerun(token: contextvars.Token) -> Optional[RerunStats]:
+        """Stop counting, warn if the rerun went over budget and return its stats."""
+        rerun = _current_rerun.get()
+        _current_rerun.reset(token)
+        if rerun is not None and rerun.count > QueryLog.RERUN_QUERY_BUDGET:
+            top = sorted(rerun.by_fingerprint.items(), key=lambda item: item[1], reverse=True)[:3]
+            logger.warning(
+                "Page '%s' issued %d queries in one rerun (budget %d, %.1f ms); most frequent: %s",
+                rerun.page, rerun.count, QueryLog.RERUN_QUERY_BUDGET, rerun.total * 1000,
+                "; ".join(f"{n}x {key[:80]}" for key, n in top)
+            )
+        return rerun
+
+    @staticmethod
+    def current_rerun() -> Optional[RerunStats]:
+        return _current_rerun.get()
@@ -0,0 +1,123 @@
+# reporting.py
+
+import argparse
+import logging
+from datetime import date, timedelta
+from typing import Any, Dict, List
+
+from utils import DBHelper, SalesRollup
+
+logger = logging.getLogger(__name__)
+
+METRICS = ("revenue", "units", "orders")
+
+
+class SalesReport:
+    """Read-only sales figures, served from the rollup tables only.
+
+    Every query reads at most one row per day (per medicine/category) in
+    the range, so its cost does not grow with the number of orders.
+    ``start`` and ``end`` are inclusive dates.
+    """
+
+    @staticmethod
+    def daily(start: date, end: date) -> List[Dict[str, Any]]:
+        """One row per day in the range, days without sales included as zeros."""
+        rows = DBHelper.fetch_all(
+            "SELECT day, orders, units, revenue FROM sales_daily WHERE day BETWEEN %s AND %s",
+            (start, end)
+        )
+        by_day = {row['day']: row for row in rows}
+        days = []
+        day = start
+        while day <= end:
+            days.append(by_day.get(day) or {"day": day, "orders": 0, "units": 0, "revenue": 0})
+            day += timedelta(days=1)
+        return days
+
+    @staticmethod
+    def totals(start: date, end: date) -> Dict[str, Any]:
+        row = DBHelper.fetch_one("""
+            SELECT COALESCE(SUM(orders), 0) AS orders, COALESCE(SUM(units), 0) AS units,
+                   COALESCE(SUM(revenue), 0) AS revenue
+            FROM sales_daily WHERE day BETWEEN %s AND %s
+        """, (start, end))
+        return row or {"orders": 0, "units": 0, "revenue": 0}
+
+    @staticmethod
+    def top_medicines(start: date, end: date, limit: int = 10,
+                      metric: str = "revenue") -> List[Dict[str, Any]]:
+        SalesReport._check_metric(metric)
+        return DBHelper.fetch_all(f"""
+            SELECT medicine_id, MAX(medicine_name) AS medicine_name,
+                   SUM(orders) AS orders, SUM(units) AS units, SUM(revenue) AS revenue
+            FROM sales_daily_medicine
+            WHERE day BETWEEN %s AND %s
+            GROUP BY medicine_id
+            ORDER BY {metric} DESC
+            LIMIT %s
+        """, (start, end, limit))
+
+    @staticmethod
+    def by_category(start: date, end: date, metric: str = "revenue") -> List[Dict[str, Any]]:
+        SalesReport._check_metric(metric)
+        return DBHelper.fetch_all(f"""
+            SELECT category, SUM(orders) AS orders, SUM(units) AS units, SUM(revenue) AS revenue
+            FROM sales_daily_category
+            WHERE day BETWEEN %s AND %s
+            GROUP BY category
+            ORDER BY {metric} DESC
+        """, (start, end))
+
+    @staticmethod
+    def _check_metric(metric: str):
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}; use one of {', '.join(METRICS)}.")
+
+
+def _print_rows(rows, columns):
+    print("  ".join(f"{column:>14}" for column in columns))
+    for row in rows:
+        print("  ".join(f"{str(row.get(column, '')):>14}" for column in columns))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="MediCare sales reports and rollup maintenance.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild", help="recompute the rollups from orders (backfill)")
+    rebuild.add_argument("--start", type=date.fromisoformat, help="first day (default: first order)")
+    rebuild.add_argument("--end", type=date.fromisoformat, help="last day (default: last order)")
+    rebuild.add_argument("--window-days", type=int, default=SalesRollup.REBUILD_WINDOW_DAYS)
+
+    for name in ("daily", "top", "categories"):
+        report = commands.add_parser(name)
+        report.add_argument("--days", type=int, default=30, help="report the last N days")
+        report.add_argument("--metric", choices=METRICS, default="revenue")
+        report.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "rebuild":
+        days = SalesRollup.rebuild(
+            args.start, args.end, args.window_days,
+            progress=lambda first, last: logger.info("Rebuilt %s .. %s", first, last)
+        )
+        print(f"Rebuilt rollups for {days} day(s).")
+        return
+
+    end = date.today()
+    start = end - timedelta(days=args.days - 1)
+    if args.command == "daily":
+        _print_rows(SalesReport.daily(start, end), ["day", "orders", "units", "revenue"])
+        print(f"Total: {SalesReport.totals(start, end)}")
+    elif args.command == "top":
+        _print_rows(SalesReport.top_medicines(start, end, args.limit, args.metric),
+                    ["medicine_id", "medicine_name", "orders", "units", "revenue"])
+    else:
+        _print_rows(SalesReport.by_category(start, end, args.metric),
+                    ["category", "orders", "units", "revenue"])
+
+
+if __name__ == "__main__":
+    main()
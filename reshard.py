@@ -0,0 +1,278 @@
+# reshard.py
+
+import argparse
+import json
+import logging
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from utils import DBConfig, DBHelper, Order, ShardRouter, UnitOfWork
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 100  # users moved per directory switch
+PENDING_FILE = Path("reshard_pending.json")  # catch-ups left to re-run with `resume`
+
+_PRIMARY = "(primary)"
+
+
+def _label(shard):
+    return shard or _PRIMARY
+
+# -------------------------------
+# 📦 Copying One User
+# -------------------------------
+def _insert_rows(uow, table, rows, ignore=False):
+    """Insert rows copied from another shard, letting the target assign new ids."""
+    if not rows:
+        return
+    columns = [column for column in rows[0] if column != "id"]
+    column_list = ", ".join(f"`{column}`" for column in columns)
+    uow.executemany(
+        f"INSERT {'IGNORE ' if ignore else ''}INTO {table} ({column_list}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))})",
+        [tuple(row[column] for column in columns) for row in rows]
+    )
+
+
+def copy_user(username, source, target, after=None) -> Dict[str, int]:
+    """Copy a user's rows from ``source`` to ``target`` in one target transaction.
+
+    Only orders and consultations with ids above ``after`` are copied (a
+    second pass picks up what was written since the first). Orders get new
+    ids on the target. The first pass replaces the target's cart; later
+    passes only add medicines the target's cart lacks, since the user may
+    already be editing it there. Returns the highest source ids copied, to
+    pass as ``after`` next time.
+    """
+    first_pass = after is None
+    after = after or {"orders": 0, "consultations": 0}
+    orders = DBHelper.fetch_all(
+        "SELECT * FROM orders WHERE user = %s AND id > %s ORDER BY id",
+        (username, after["orders"]), shard=source
+    )
+    items = Order.get_items_for_orders([order['id'] for order in orders], source)
+    consultations = DBHelper.fetch_all(
+        "SELECT * FROM consultations WHERE user = %s AND id > %s ORDER BY id",
+        (username, after["consultations"]), shard=source
+    )
+    cart = DBHelper.fetch_all("SELECT * FROM cart WHERE user = %s", (username,), shard=source)
+
+    with UnitOfWork(target) as uow:
+        for order in orders:
+            _insert_rows(uow, "orders", [order])
+            new_id = uow.lastrowid
+            _insert_rows(uow, "order_items", [dict(item, order_id=new_id) for item in items[order['id']]])
+        _insert_rows(uow, "consultations", consultations)
+        if first_pass:
+            uow.execute("DELETE FROM cart WHERE user = %s", (username,))
+        # uq_cart_user_medicine keeps the target's lines on later passes
+        _insert_rows(uow, "cart", cart, ignore=not first_pass)
+
+    return {
+        "orders": orders[-1]['id'] if orders else after["orders"],
+        "consultations": consultations[-1]['id'] if consultations else after["consultations"],
+    }
+
+
+def delete_user(username, shard):
+    """Remove a user's rows from ``shard`` once they live elsewhere."""
+    with UnitOfWork(shard) as uow:
+        uow.execute("""
+            DELETE i FROM order_items i JOIN orders o ON o.id = i.order_id WHERE o.user = %s
+        """, (username,))
+        uow.execute("DELETE FROM orders WHERE user = %s", (username,))
+        uow.execute("DELETE FROM consultations WHERE user = %s", (username,))
+        uow.execute("DELETE FROM cart WHERE user = %s", (username,))
+
+# -------------------------------
+# 🚚 Moving Users
+# -------------------------------
+@dataclass
+class CatchUp:
+    """A user already switched to ``target`` whose rows on ``source`` still need copying and deleting."""
+    username: str
+    source: Optional[str]
+    target: str
+    marks: Dict[str, int]
+
+
+@dataclass
+class MoveReport:
+    moved: List[Tuple[str, str, str]] = field(default_factory=list)
+    failed: List[Tuple[str, str]] = field(default_factory=list)
+    pending: List[CatchUp] = field(default_factory=list)
+
+
+def move_users(moves: List[Tuple[str, Optional[str], str]], wait: Optional[float] = None,
+               batch_size: int = BATCH_SIZE) -> MoveReport:
+    """Move users between shards while the app keeps running.
+
+    ``moves`` holds ``(username, source, target)``. Per batch: copy every
+    user to its target, point the shard directory at the target, wait
+    ``wait`` seconds (default ``DBConfig.SHARD_DIRECTORY_TTL``) until every
+    process has dropped its cached entry, copy what was written to the
+    source meanwhile, then delete the user from the source. A user whose
+    first copy fails is left where it was; one whose catch-up fails is
+    already served from the target and lands in ``report.pending`` (see
+    ``catch_up()``). Moved orders get new ids.
+    """
+    wait = DBConfig.SHARD_DIRECTORY_TTL if wait is None else wait
+    report = MoveReport()
+    for start in range(0, len(moves), batch_size):
+        batch = moves[start:start + batch_size]
+        copied: List[CatchUp] = []
+        for username, source, target in batch:
+            marks = None
+            try:
+                marks = copy_user(username, source, target)
+                ShardRouter.set_override(username, target)
+            except Exception as e:
+                logger.exception("Could not copy %s to %s", username, target)
+                report.failed.append((username, str(e)))
+                if marks is not None:
+                    delete_user(username, target)  # the source is still authoritative
+                continue
+            copied.append(CatchUp(username, source, target, marks))
+
+        if copied and wait:
+            logger.info("Waiting %.0fs for cached shard lookups to expire", wait)
+            time.sleep(wait)
+
+        catch_up(copied, report)
+        logger.info("Moved %d of %d user(s)", len(report.moved), len(moves))
+    return report
+
+
+def catch_up(entries: List[CatchUp], report: MoveReport) -> MoveReport:
+    """Copy what was written to each source since ``marks``, then delete the user there.
+
+    A user counts as moved once both steps succeed. Otherwise the entry,
+    with its marks advanced past whatever was copied, goes to
+    ``report.pending`` and can be passed here again.
+    """
+    for entry in entries:
+        try:
+            entry.marks = copy_user(entry.username, entry.source, entry.target, after=entry.marks)
+            delete_user(entry.username, entry.source)
+        except Exception as e:
+            # The directory already points at the target, which serves the user meanwhile
+            logger.exception("Catching up %s from %s failed", entry.username, _label(entry.source))
+            report.failed.append((entry.username, f"catch-up from {_label(entry.source)}: {e}"))
+            report.pending.append(entry)
+            continue
+        report.moved.append((entry.username, _label(entry.source), entry.target))
+    return report
+
+
+def save_pending(entries: List[CatchUp], path: Path = PENDING_FILE):
+    if entries:
+        path.write_text(json.dumps([asdict(entry) for entry in entries], indent=2), encoding="utf-8")
+    elif path.exists():
+        path.unlink()
+
+
+def load_pending(path: Path = PENDING_FILE) -> List[CatchUp]:
+    return [CatchUp(**entry) for entry in json.loads(path.read_text(encoding="utf-8"))]
+
+
+def usernames() -> Iterator[str]:
+    for rows in DBHelper.stream("SELECT username FROM users ORDER BY username"):
+        for row in rows:
+            yield row['username']
+
+
+def plan(mapping, from_primary=False) -> List[Tuple[str, Optional[str], str]]:
+    """Users whose shard under ``mapping`` differs from where their rows are now."""
+    moves = []
+    for username in usernames():
+        source = None if from_primary else ShardRouter.shard_for(username)
+        target = ShardRouter.hashed_shard(username, mapping)
+        if source != target:
+            moves.append((username, source, target))
+    return moves
+
+
+def prune_overrides() -> int:
+    """Drop directory entries that only repeat what the current shard map says."""
+    rows = DBHelper.fetch_all("SELECT username, shard FROM shard_directory", primary=True)
+    pruned = 0
+    for row in rows:
+        if ShardRouter.hashed_shard(row['username']) == row['shard']:
+            ShardRouter.set_override(row['username'], None)
+            pruned += 1
+    return pruned
+
+
+def load_layout(path: Path):
+    """Read ``{"shards": {...}, "map": [[first_bucket, name], ...]}``; new shards are added."""
+    layout = json.loads(path.read_text(encoding="utf-8"))
+    DBConfig.SHARDS = dict(DBConfig.SHARDS, **layout.get("shards", {}))
+    return ShardRouter.shard_map([tuple(entry) for entry in layout["map"]])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move MediCare users between shard databases.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    move = commands.add_parser("move", help="move one user to a shard")
+    move.add_argument("username")
+    move.add_argument("shard")
+    move.add_argument("--wait", type=float, help="seconds for cached lookups to expire")
+
+    rebalance = commands.add_parser("rebalance", help="move every user to its shard under a new map")
+    rebalance.add_argument("layout", type=Path, help='JSON: {"shards": {...}, "map": [[0, "s1"], ...]}')
+    rebalance.add_argument("--dry-run", action="store_true", help="only list the moves")
+    rebalance.add_argument("--wait", type=float, help="seconds for cached lookups to expire")
+    rebalance.add_argument("--from-primary", action="store_true",
+                           help="first split of unsharded data (run with the app stopped)")
+
+    resume = commands.add_parser("resume", help="re-run catch-ups that failed in an earlier move")
+    resume.add_argument("--pending", type=Path, default=PENDING_FILE)
+
+    commands.add_parser("prune", help="drop directory entries the shard map already implies")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "prune":
+        print(f"Pruned {prune_overrides()} directory entr(ies).")
+        return 0
+
+    if args.command == "resume":
+        if not args.pending.exists():
+            print("Nothing to resume.")
+            return 0
+        report = catch_up(load_pending(args.pending), MoveReport())
+    elif args.command == "move":
+        if args.shard not in DBConfig.SHARDS:
+            parser.error(f"unknown shard {args.shard!r}")
+        source = ShardRouter.shard_for(args.username)
+        moves = [(args.username, source, args.shard)] if source != args.shard else []
+    else:
+        moves = plan(load_layout(args.layout), args.from_primary)
+        for username, source, target in moves:
+            print(f"{username}: {_label(source)} -> {target}")
+        if args.dry_run:
+            print(f"{len(moves)} user(s) would move.")
+            return 0
+
+    if args.command != "resume":
+        report = move_users(moves, wait=args.wait)
+    for username, error in report.failed:
+        print(f"failed  {username}: {error}", file=sys.stderr)
+    print(f"Moved {len(report.moved)} user(s); {len(report.failed)} problem(s).")
+    pending_file = args.pending if args.command == "resume" else PENDING_FILE
+    save_pending(report.pending, pending_file)
+    if report.pending:
+        print(f"{len(report.pending)} catch-up(s) saved to {pending_file}; "
+              f"re-run them with `python reshard.py resume`.")
+    if args.command == "rebalance":
+        print("Switch DBConfig.SHARD_MAP to the new map, then run `python reshard.py prune`.")
+    return 1 if report.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+# search.py
+
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Per-field boost applied to term frequencies (BM25F-style)
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "category": 1.5,
+    "manufacturer": 1.0,
+    "description": 1.0,
+}
+
+# Cap on how many vocabulary tokens a trailing prefix may expand to
+MAX_PREFIX_EXPANSIONS = 50
+
+
+def tokenize(text: Any) -> List[str]:
+    """Lowercase, strip accents and split text into alphanumeric tokens."""
+    if not text:
+        return []
+    normalized = unicodedata.normalize("NFKD", str(text))
+    ascii_text = normalized.encode("ascii", "ignore").decode("ascii")
+    return TOKEN_RE.findall(ascii_text.lower())
+
+
+class SearchIndex:
+    """In-memory inverted index over medicine rows with BM25F ranking.
+
+    Postings map each normalized token to ``{doc_id: per-field tf}``; field
+    lengths are normalized per field so a hit in a short name outranks one
+    buried in a long description. Every query token must match, and the
+    last one also matches as a prefix so results keep up with typing.
+    """
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, docs: Iterable[Dict[str, Any]] = (), fields: Optional[Dict[str, float]] = None):
+        self.fields = tuple((fields or FIELD_WEIGHTS).items())
+        self._postings: Dict[str, Dict[Any, Tuple[int, ...]]] = defaultdict(dict)
+        self._doc_terms: Dict[Any, Tuple[str, ...]] = {}
+        self._doc_lens: Dict[Any, Tuple[int, ...]] = {}
+        self._field_totals = [0] * len(self.fields)
+        self._vocabulary: List[str] = []
+        self._vocabulary_dirty = False
+        self._owned: Optional[set] = None  # tokens whose postings a derived index has copied
+        self._lock = threading.RLock()
+        with self._lock:
+            for doc in docs:
+                self._add(doc)
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def add(self, doc: Dict[str, Any]):
+        """Index a document, replacing any previous version with the same id."""
+        with self._lock:
+            self._add(doc)
+
+    def remove(self, doc_id: Any):
+        with self._lock:
+            self._remove(doc_id)
+
+    def replaced(self, doc: Dict[str, Any]) -> "SearchIndex":
+        """Return a new index with ``doc`` added or replaced; this one is left as it was.
+
+        The new index shares postings with this one and copies only those
+        of the terms the old and new versions of ``doc`` touch.
+        """
+        with self._lock:
+            derived = SearchIndex.__new__(SearchIndex)
+            derived.fields = self.fields
+            derived._postings = defaultdict(dict, self._postings)
+            derived._doc_terms = dict(self._doc_terms)
+            derived._doc_lens = dict(self._doc_lens)
+            derived._field_totals = list(self._field_totals)
+            derived._vocabulary = self._vocabulary  # replaced, never changed in place
+            derived._vocabulary_dirty = self._vocabulary_dirty
+            derived._owned = set()
+            derived._lock = threading.RLock()
+        with derived._lock:
+            derived._add(doc)
+        return derived
+
+    def _own(self, token: str) -> Dict[Any, Tuple[int, ...]]:
+        postings = self._postings[token]
+        if self._owned is not None and token not in self._owned:
+            postings = self._postings[token] = dict(postings)
+            self._owned.add(token)
+        return postings
+
+    def _add(self, doc: Dict[str, Any]):
+        doc_id = doc.get("id")
+        n_fields = len(self.fields)
+        counts: Dict[str, List[int]] = {}
+        lengths = []
+        for i, (field, _weight) in enumerate(self.fields):
+            tokens = tokenize(doc.get(field))
+            lengths.append(len(tokens))
+            for token in tokens:
+                counts.setdefault(token, [0] * n_fields)[i] += 1
+
+        self._remove(doc_id)
+        for token, tfs in counts.items():
+            postings = self._own(token)
+            if not postings:
+                self._vocabulary_dirty = True
+            postings[doc_id] = tuple(tfs)
+        self._doc_terms[doc_id] = tuple(counts)
+        self._doc_lens[doc_id] = tuple(lengths)
+        for i, length in enumerate(lengths):
+            self._field_totals[i] += length
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Tuple[Any, float]]:
+        """Return ``(doc_id, score)`` pairs, best match first."""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+
+        with self._lock:
+            n_docs = len(self._doc_terms)
+            if not n_docs:
+                return []
+            avg_lens = [max(total / n_docs, 1e-9) for total in self._field_totals]
+
+            scores: Optional[Dict[Any, float]] = None
+            for position, token in enumerate(tokens):
+                is_last = position == len(tokens) - 1
+                candidates = self._expand(token) if is_last else [token]
+                token_scores: Dict[Any, float] = {}
+                for term in candidates:
+                    for doc_id, score in self._score_term(term, n_docs, avg_lens).items():
+                        if score > token_scores.get(doc_id, 0.0):
+                            token_scores[doc_id] = score
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = {
+                        doc_id: total + token_scores[doc_id]
+                        for doc_id, total in scores.items()
+                        if doc_id in token_scores
+                    }
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], str(item[0])))
+        return ranked[:limit] if limit else ranked
+
+    def _remove(self, doc_id: Any):
+        terms = self._doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        for token in terms:
+            if token not in self._postings:
+                continue
+            postings = self._own(token)
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[token]
+                self._vocabulary_dirty = True
+        for i, length in enumerate(self._doc_lens.pop(doc_id, ())):
+            self._field_totals[i] -= length
+
+    def _expand(self, prefix: str) -> List[str]:
+        if self._vocabulary_dirty:
+            self._vocabulary = sorted(self._postings)
+            self._vocabulary_dirty = False
+        vocabulary = self._vocabulary
+        matches = []
+        # Walk by index from the first candidate: no copy of the vocabulary's tail
+        for i in range(bisect_left(vocabulary, prefix), len(vocabulary)):
+            term = vocabulary[i]
+            if not term.startswith(prefix) or len(matches) >= MAX_PREFIX_EXPANSIONS:
+                break
+            matches.append(term)
+        return matches
+
+    def _score_term(self, term: str, n_docs: int, avg_lens: List[float]) -> Dict[Any, float]:
+        postings = self._postings.get(term)
+        if not postings:
+            return {}
+        df = len(postings)
+        idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        k1, b = self.K1, self.B
+        weights = [weight for _field, weight in self.fields]
+        scores = {}
+        for doc_id, tfs in postings.items():
+            lens = self._doc_lens[doc_id]
+            tf = 0.0
+            for i, count in enumerate(tfs):
+                if count:
+                    tf += weights[i] * count / (1 - b + b * lens[i] / avg_lens[i])
+            scores[doc_id] = idf * tf * (k1 + 1) / (tf + k1)
+        return scores
@@ -1,19 +1,18 @@
 # signup.py
 import streamlit as st
-from utils import Validator, User, StreamlitHelper
+from utils import Validator, User, StreamlitHelper, DuplicateUserError
+from assets import AssetPipeline
 
 class SignupPage:
     def __init__(self):
         self.username = ""
         self.email = ""
         self.password = ""
-        self.user_data = st.session_state.get("user_data") or User.load_users()
-        st.session_state["user_data"] = self.user_data
         self.errors = []
 
     def render(self):
         # Custom CSS for professional styling
-        st.markdown("""
+        AssetPipeline.inject_css("signup", """
         <style>
         .main-header {
             text-align: center;
@@ -152,7 +151,7 @@ class SignupPage:
             margin: 0.25rem 0;
         }
         </style>
-        """, unsafe_allow_html=True)
+        """)
 
         # Header section
         st.markdown('<h1 class="main-header">🚀 Join Our Platform</h1>', unsafe_allow_html=True)
@@ -280,12 +279,14 @@ class SignupPage:
         self.errors = []  # Reset errors
         
         if self.username:
-            if self.username in self.user_data:
+            if User.username_exists(self.username):
                 self.errors.append("⚠️ Username already exists. Please choose a different one.")
         
         if self.email:
             if not Validator.is_valid_email(self.email):
                 self.errors.append("❌ Please enter a valid email address.")
+            elif User.email_exists(self.email):
+                self.errors.append("⚠️ Email is already registered. Please log in instead.")
         
         if self.password:
             valid_pwd, pwd_msg = Validator.is_valid_password(self.password)
@@ -294,12 +295,20 @@ class SignupPage:
 
     def handle_signup(self):
         if self.username and self.email and self.password and not self.errors:
-            self.user_data[self.username] = {
-                "email": self.email,
-                "password": self.password,
-                "role": "user"
-            }
-            User.save_users(self.user_data)
+            try:
+                User.create_user(
+                    self.username.strip(),
+                    User.normalize(self.email),
+                    self.password,
+                    role="user"
+                )
+            except DuplicateUserError:
+                st.markdown("""
+                <div class="error-message">
+                    ⚠️ That username or email was just registered. Please choose another.
+                </div>
+                """, unsafe_allow_html=True)
+                return
 
             # Success message with custom styling
             st.markdown("""
@@ -325,7 +334,7 @@ class SignupPage:
             """, unsafe_allow_html=True)
 
 
-# Run the signup page
-if __name__ == "__main__" or st.session_state.get("current_page") == "signup":
+# Run the signup page (importing this module has no side effects)
+if __name__ == "__main__":
     page = SignupPage()
     page.render()
\ No newline at end of file
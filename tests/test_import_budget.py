@@ -0,0 +1,49 @@
+# test_import_budget.py
+"""Cold-start guard: page modules load lazily and import quickly."""
+
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from bench import LAZY_MODULES
+
+ROOT = Path(__file__).resolve().parent.parent
+PAGES = ("landing", "login", "signup", "dashboard", "medicines", "orders", "cart", "consult")
+REPEAT = 3
+
+MAIN_BUDGET = 2.0  # seconds for `import main`, Streamlit included
+PAGE_BUDGET = 0.5  # seconds for a page's own import once Streamlit and utils are loaded
+
+
+def import_time(module, preload=()):
+    """Best-of-``REPEAT`` seconds to import ``module`` in a fresh interpreter, and what it loaded."""
+    probe = (
+        "import json, sys, time\n"
+        + "".join(f"import {name}\n" for name in preload)
+        + "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "elapsed = time.perf_counter() - start\n"
+        "print(json.dumps({'seconds': elapsed, 'modules': sorted(sys.modules)}))\n"
+    )
+    best, modules = float("inf"), []
+    for _ in range(REPEAT):
+        out = subprocess.run([sys.executable, "-c", probe], cwd=ROOT, check=True,
+                             capture_output=True, text=True).stdout
+        sample = json.loads(out.strip().splitlines()[-1])
+        best, modules = min(best, sample["seconds"]), sample["modules"]
+    return best, modules
+
+
+def test_main_loads_no_page_module():
+    seconds, modules = import_time("main")
+    assert [name for name in LAZY_MODULES if name in modules] == []
+    assert seconds < MAIN_BUDGET, f"import main took {seconds:.2f}s (budget {MAIN_BUDGET}s)"
+
+
+@pytest.mark.parametrize("page", PAGES)
+def test_page_import_budget(page):
+    seconds, _modules = import_time(page, preload=("streamlit", "utils"))
+    assert seconds < PAGE_BUDGET, f"import {page} took {seconds:.2f}s (budget {PAGE_BUDGET}s)"
@@ -0,0 +1,215 @@
+# test_read_router.py
+"""ReadRouter and DBEndpoint against stand-in servers (no MySQL needed)."""
+
+import time
+
+import pymysql
+import pytest
+
+from utils import DBConfig, DBEndpoint, DBHelper, ReadRouter, UnitOfWork
+
+PRIMARY = "primary"
+
+
+class FakeServer:
+    """Stand-in for every MySQL host: answers each read with the host's name."""
+
+    def __init__(self):
+        self.down = set()
+        self.lag = {}
+
+    def connect(self, host, port, db=None, **_kwargs):
+        if host in self.down:
+            raise pymysql.err.OperationalError(2003, f"Can't connect to MySQL server on '{host}'")
+        return FakeConnection(self, host)
+
+
+class FakeConnection:
+    def __init__(self, server, host):
+        self.server = server
+        self.host = host
+        self.open = True
+
+    def cursor(self, *_args):
+        return FakeCursor(self)
+
+    def ping(self, reconnect=False):
+        if self.host in self.server.down:
+            raise pymysql.err.OperationalError(2006, "MySQL server has gone away")
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.open = False
+
+
+class FakeCursor:
+    rowcount = 1
+    lastrowid = 1
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.query = ""
+
+    def execute(self, query, params=None):
+        if self.conn.host in self.conn.server.down:
+            raise pymysql.err.OperationalError(2013, "Lost connection to MySQL server during query")
+        self.query = query
+        return 1
+
+    def fetchall(self):
+        return [{"host": self.conn.host}]
+
+    def fetchone(self):
+        if self.query.startswith("SHOW REPLICA STATUS"):
+            return {"Seconds_Behind_Source": self.conn.server.lag.get(self.conn.host, 0)}
+        return {"host": self.conn.host}
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(DBConfig, "CONNECTOR", server.connect)
+    monkeypatch.setattr(DBConfig, "HOST", PRIMARY)
+    monkeypatch.setattr(DBConfig, "REPLICAS", ["r1", "r2:3307"])
+    monkeypatch.setattr(DBConfig, "REPLICA_CHECK_INTERVAL", 3600)
+    monkeypatch.setattr(DBConfig, "READ_AFTER_WRITE_WINDOW", 0.2)
+    monkeypatch.setattr(DBConfig, "_pool", None)
+    monkeypatch.setattr(DBConfig, "_router", None)
+    monkeypatch.setattr(ReadRouter, "_pins", {})
+    yield server
+    if DBConfig._router is not None:
+        DBConfig._router.close()
+    DBConfig.get_pool().close()
+
+
+def read_host():
+    return DBHelper.fetch_one("SELECT 1")["host"]
+
+
+def router(*hosts, strategy="round_robin", max_lag=None):
+    return ReadRouter([DBEndpoint.parse(host) for host in hosts], strategy, 3600, max_lag)
+
+
+def test_endpoint_parse():
+    assert DBEndpoint.parse("r1") == DBEndpoint("r1", DBConfig.PORT)
+    assert DBEndpoint.parse("r2:3307") == DBEndpoint("r2", 3307)
+    assert DBEndpoint.parse({"host": "s1", "db": "medicare_s1"}) == DBEndpoint("s1", DBConfig.PORT, "medicare_s1")
+    assert DBEndpoint.parse("r2:3307").name == "r2:3307"
+
+
+def test_unknown_strategy_is_rejected():
+    with pytest.raises(ValueError):
+        router("r1", strategy="random")
+
+
+def test_without_replicas_reads_go_to_the_primary(server, monkeypatch):
+    monkeypatch.setattr(DBConfig, "REPLICAS", [])
+    assert [read_host() for _ in range(3)] == [PRIMARY] * 3
+
+
+def test_round_robin_alternates_between_replicas(server):
+    hosts = [read_host() for _ in range(4)]
+    assert sorted(set(hosts)) == ["r1", "r2"]
+    assert hosts[0] != hosts[1] and hosts[:2] == hosts[2:]
+
+
+def test_least_latency_prefers_the_fastest_replica(server):
+    reads = router("a", "b", strategy="least_latency")
+    a, b = reads.replicas
+    assert reads.choose() is a  # unmeasured replicas go first
+    reads.observe(a, 0.010)
+    reads.observe(b, 0.002)
+    assert reads.choose() is b
+    for _ in range(20):
+        reads.observe(b, 0.050)  # b slows down; the moving average follows
+    assert reads.choose() is a
+    reads.close()
+
+
+def test_mark_down_skips_the_replica_until_a_check_reaches_it(server):
+    reads = router("r1", "r2")
+    r1, r2 = reads.replicas
+    reads.mark_down(r1, "connection refused")
+    assert {reads.choose() for _ in range(4)} == {r2}
+    assert r1.stats()["healthy"] is False and r1.failures == 1
+
+    reads.mark_down(r2, "connection refused")
+    assert reads.choose() is None  # no healthy replica: read from the primary
+
+    assert reads.check_all() == {"r1:3306": True, "r2:3306": True}
+    assert {reads.choose() for _ in range(4)} == {r1, r2}
+    reads.close()
+
+
+def test_unreachable_replica_is_marked_down_and_the_read_retried_on_the_primary(server):
+    DBConfig.get_router()
+    server.down.add("r1")
+    hosts = [read_host() for _ in range(4)]
+    assert "r1" not in hosts and PRIMARY in hosts
+    r1 = DBConfig.get_router().replicas[0]
+    assert not r1.healthy
+    assert [read_host() for _ in range(3)] == ["r2"] * 3
+
+    server.down.discard("r1")
+    assert DBConfig.get_router().check(r1)
+    assert sorted({read_host() for _ in range(4)}) == ["r1", "r2"]
+
+
+def test_lagging_replica_is_taken_out_of_rotation(server):
+    reads = router("r1", "r2", max_lag=5)
+    server.lag["r1"] = 30
+    assert reads.check_all() == {"r1:3306": False, "r2:3306": True}
+    assert {reads.choose() for _ in range(4)} == {reads.replicas[1]}
+    reads.close()
+
+
+def test_a_write_pins_the_session_to_the_primary_for_the_window(server):
+    token = ReadRouter.bind("session-a")
+    try:
+        DBHelper.execute("UPDATE medicines SET stock = 1 WHERE id = 1")
+        assert ReadRouter.pinned()
+        assert [read_host() for _ in range(3)] == [PRIMARY] * 3
+    finally:
+        ReadRouter.release(token)
+
+    # Other sessions, and reads outside any session, keep using the replicas
+    other = ReadRouter.bind("session-b")
+    try:
+        assert read_host() != PRIMARY
+    finally:
+        ReadRouter.release(other)
+    assert read_host() != PRIMARY
+
+
+def test_the_pin_expires_after_the_window(server):
+    token = ReadRouter.bind("session-a")
+    try:
+        with UnitOfWork() as uow:
+            uow.execute("INSERT INTO cart (user, medicine_id, quantity) VALUES (%s, %s, %s)", ("a", 1, 1))
+        assert read_host() == PRIMARY
+        time.sleep(DBConfig.READ_AFTER_WRITE_WINDOW + 0.05)
+        assert not ReadRouter.pinned()
+        assert read_host() != PRIMARY
+    finally:
+        ReadRouter.release(token)
+
+
+def test_primary_reads_skip_the_replicas(server):
+    assert DBHelper.fetch_one("SELECT 1", primary=True)["host"] == PRIMARY
@@ -0,0 +1,168 @@
+# tracing.py
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class _TraceFileHandler(RotatingFileHandler):
+    """Rotating handler whose files each open a Chrome trace JSON array.
+
+    Events are written as ``{...},`` lines after a leading ``[``; trace
+    viewers (chrome://tracing, Perfetto) accept the array unterminated.
+    """
+
+    def _open(self):
+        stream = super()._open()
+        if stream.tell() == 0:
+            stream.write("[\n")
+            stream.flush()
+        return stream
+
+
+class Trace:
+    """Spans collected during one sampled rerun, flushed together at its end."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, cat: str, start: float, duration: float, args: Optional[Dict] = None):
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": round(start * 1e6, 3),
+            "dur": round(duration * 1e6, 3),
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self.events.append(event)
+
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("current_trace", default=None)
+
+
+class Tracer:
+    """Nested span tracing of Streamlit reruns in Chrome Trace Event format.
+
+        with Tracer.trace("rerun:dashboard"):
+            with Tracer.span("sidebar_menu"):
+                ...
+
+    Only ``SAMPLE_RATE`` of the reruns are traced (``MEDICARE_TRACE_SAMPLE_RATE``
+    overrides it); for the others every span is a no-op. Spans become
+    complete ("X") events, so nesting follows from their timestamps per
+    thread. A sampled rerun is appended to ``TRACE_FILE`` as one write,
+    rotated at ``MAX_BYTES``.
+    """
+    SAMPLE_RATE = float(os.environ.get("MEDICARE_TRACE_SAMPLE_RATE", "0.01"))
+    TRACE_FILE = Path(__file__).resolve().parent / "traces" / "medicare.trace.json"
+    MAX_BYTES = 5 * 1024 * 1024
+    BACKUP_COUNT = 3
+
+    _writer = None
+    _writer_lock = threading.Lock()
+
+    @staticmethod
+    @contextmanager
+    def trace(name: str, sampled: Optional[bool] = None, **args):
+        """Root span of one rerun; sampled at ``SAMPLE_RATE`` unless ``sampled`` is given."""
+        if sampled is None:
+            sampled = Tracer.SAMPLE_RATE > 0 and random.random() < Tracer.SAMPLE_RATE
+        if not sampled or _current_trace.get() is not None:
+            yield None
+            return
+
+        trace = Trace(name)
+        token = _current_trace.set(trace)
+        try:
+            with Tracer.span(name, cat="rerun", **args):
+                yield trace
+        finally:
+            _current_trace.reset(token)
+            Tracer._write(trace)
+
+    @staticmethod
+    @contextmanager
+    def span(name: str, cat: str = "app", **args):
+        """Time the enclosed block as a child of the current span (no-op when not traced)."""
+        trace = _current_trace.get()
+        if trace is None:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            # Streamlit reruns/stops unwind through here too; record and re-raise
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            trace.add(name, cat, started, time.perf_counter() - started, args)
+
+    @staticmethod
+    def traced(name: Optional[str] = None, cat: str = "app"):
+        """Decorator form of ``span``; defaults to the function's qualified name."""
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            def wrapper(*a, **kw):
+                if _current_trace.get() is None:
+                    return func(*a, **kw)
+                with Tracer.span(span_name, cat):
+                    return func(*a, **kw)
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def add_span(name: str, cat: str, started: float, duration: float, **args):
+        """Record an already-timed block (``started`` from ``time.perf_counter``)."""
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(name, cat, started, duration, args)
+
+    @staticmethod
+    def active() -> bool:
+        return _current_trace.get() is not None
+
+    @staticmethod
+    def _write(trace: Trace):
+        if not trace.events:
+            return
+        try:
+            writer = Tracer._get_writer()
+            lines = ",\n".join(json.dumps(event, default=str) for event in trace.events)
+            writer.handle(logging.makeLogRecord({"msg": lines + ",", "levelno": logging.INFO}))
+        except Exception:
+            logger.warning("Could not write trace for %s", trace.name, exc_info=True)
+
+    @staticmethod
+    def _get_writer():
+        if Tracer._writer is None:
+            with Tracer._writer_lock:
+                if Tracer._writer is None:
+                    Tracer.TRACE_FILE.parent.mkdir(parents=True, exist_ok=True)
+                    handler = _TraceFileHandler(
+                        Tracer.TRACE_FILE, maxBytes=Tracer.MAX_BYTES,
+                        backupCount=Tracer.BACKUP_COUNT, encoding="utf-8"
+                    )
+                    handler.setFormatter(logging.Formatter("%(message)s"))
+                    Tracer._writer = handler
+        return Tracer._writer
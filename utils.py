@@ -1,10 +1,33 @@
 # utils.py
 
+import atexit
+import bisect
 import pymysql
+from pymysql.constants import CR, ER
 import re
-from datetime import datetime
+import threading
+import time
+import logging
+import contextvars
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Optional
 import streamlit as st
 
+from querylog import QueryLog, fingerprint
+from search import SearchIndex
+from tracing import Tracer
+
+if TYPE_CHECKING:
+    from expiry import ExpiryTable
+
+logger = logging.getLogger(__name__)
+
 # -------------------------------
 # ⚙️ Database Configuration
 # -------------------------------
@@ -14,139 +37,1896 @@ class DBConfig:
     PASSWORD = 'root'
     DB_NAME = 'medicare_db'
 
+    # Connection pool tuning (seconds where applicable)
+    POOL_MIN_SIZE = 1
+    POOL_MAX_SIZE = 10
+    POOL_TIMEOUT = 10
+    POOL_IDLE_TIMEOUT = 300
+    POOL_MAX_LIFETIME = 3600
+    POOL_PING_INTERVAL = 5
+
+    # Read replicas as "host" or "host:port"; empty sends every read to HOST
+    PORT = 3306
+    REPLICAS = []
+    READ_STRATEGY = "round_robin"  # or "least_latency"
+    READ_AFTER_WRITE_WINDOW = 5  # seconds a session's reads stay on the primary after it writes
+    REPLICA_CHECK_INTERVAL = 5
+    REPLICA_MAX_LAG = None  # seconds of replication lag tolerated; None skips the lag check
+
+    # Per-user tables (orders, order_items, consultations, cart) split over
+    # shard databases; empty keeps them on HOST with everything else
+    SHARDS = {}  # name -> "host", "host:port" or {"host": ..., "port": ..., "db": ...}
+    SHARD_MAP = None  # [(first_bucket, name), ...]; None splits the buckets evenly
+    SHARD_BUCKETS = 1024
+    SHARD_DIRECTORY_TTL = 30  # seconds a process caches a user's directory entry
+
+    # Callable taking pymysql.connect's keyword arguments; swap it to point
+    # the app at stand-in servers
+    CONNECTOR = pymysql.connect
+
+    _pool = None
+    _pool_lock = threading.Lock()
+    _router = None
+
     @staticmethod
-    def get_connection():
-        """Create and return a new MySQL database connection."""
-        return pymysql.connect(
-            host=DBConfig.HOST,
+    def create_connection(host=None, port=None, db=None):
+        """Open a new raw MySQL connection (used by the pools); defaults to the primary."""
+        return DBConfig.CONNECTOR(
+            host=host or DBConfig.HOST,
+            port=port or DBConfig.PORT,
             user=DBConfig.USER,
             password=DBConfig.PASSWORD,
-            db=DBConfig.DB_NAME,
+            db=db or DBConfig.DB_NAME,
             cursorclass=pymysql.cursors.DictCursor,
             autocommit=True
         )
 
+    @staticmethod
+    def get_pool():
+        """Return the process-wide connection pool, creating it on first use."""
+        if DBConfig._pool is None:
+            with DBConfig._pool_lock:
+                if DBConfig._pool is None:
+                    DBConfig._pool = DBConfig.create_pool(DBConfig.create_connection)
+        return DBConfig._pool
+
+    @staticmethod
+    def create_pool(factory):
+        """Build a ConnectionPool over ``factory`` with the POOL_* settings."""
+        return ConnectionPool(
+            factory,
+            min_size=DBConfig.POOL_MIN_SIZE,
+            max_size=DBConfig.POOL_MAX_SIZE,
+            timeout=DBConfig.POOL_TIMEOUT,
+            idle_timeout=DBConfig.POOL_IDLE_TIMEOUT,
+            max_lifetime=DBConfig.POOL_MAX_LIFETIME,
+            ping_interval=DBConfig.POOL_PING_INTERVAL
+        )
+
+    @staticmethod
+    def get_connection():
+        """Borrow a pooled connection: ``with DBConfig.get_connection() as conn``."""
+        return DBConfig.get_pool().connection()
+
+    @staticmethod
+    def get_router():
+        """Return the process-wide ReadRouter over ``REPLICAS``, creating it on first use."""
+        if DBConfig._router is None:
+            with DBConfig._pool_lock:
+                if DBConfig._router is None:
+                    DBConfig._router = ReadRouter(
+                        [DBEndpoint.parse(spec) for spec in DBConfig.REPLICAS],
+                        strategy=DBConfig.READ_STRATEGY,
+                        check_interval=DBConfig.REPLICA_CHECK_INTERVAL,
+                        max_lag=DBConfig.REPLICA_MAX_LAG
+                    )
+        return DBConfig._router
+
+    @staticmethod
+    def pool_stats():
+        """Return a snapshot of connection pool counters."""
+        return DBConfig.get_pool().stats()
+
+# -------------------------------
+# 🏊 Connection Pool
+# -------------------------------
+class PoolTimeoutError(Exception):
+    """Raised when no pooled connection becomes free within the timeout."""
+
+
+class _PoolEntry:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class _PooledConnection:
+    """Context manager that lends a connection and hands it back on exit."""
+
+    def __init__(self, pool):
+        self._pool = pool
+        self._entry = None
+        self._discard = False
+
+    def __enter__(self):
+        self._entry = self._pool.acquire()
+        return self._entry.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        broken = isinstance(exc, (pymysql.err.OperationalError, pymysql.err.InterfaceError))
+        self._pool.release(self._entry, discard=broken or self._discard)
+        self._entry = None
+        return False
+
+    def discard(self):
+        """Close the connection on exit instead of returning it to the pool."""
+        self._discard = True
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of MySQL connections.
+
+    Idle connections are reused most-recently-used first. Connections idle
+    longer than ``idle_timeout`` are closed down to ``min_size``, connections
+    older than ``max_lifetime`` are recycled, and a connection that has been
+    idle for more than ``ping_interval`` is pinged before being handed out.
+    """
+
+    def __init__(self, factory, min_size=1, max_size=10, timeout=10,
+                 idle_timeout=300, max_lifetime=3600, ping_interval=5):
+        self.factory = factory
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.ping_interval = ping_interval
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self._counters = {
+            "created": 0,
+            "closed": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "failed_health_checks": 0
+        }
+
+    def connection(self):
+        return _PooledConnection(self)
+
+    def acquire(self):
+        """Check out a healthy connection, blocking up to ``timeout`` seconds."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            entry, stale = self._reserve(deadline)
+            self._close_all(stale)
+            if entry is None:
+                return self._create()
+            if self._is_healthy(entry):
+                return entry
+            # Keep the slot reserved and open a replacement in its place
+            self._close_all([entry], release_slots=False)
+            return self._create()
+
+    def release(self, entry, discard=False):
+        """Return a connection to the pool (or close it if unusable)."""
+        if entry is None:
+            return
+        now = time.monotonic()
+        expired = now - entry.created_at > self.max_lifetime
+        if discard or expired or not entry.conn.open:
+            self._close_all([entry])
+            return
+        entry.last_used = now
+        with self._cond:
+            self._idle.append(entry)
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            idle = len(self._idle)
+            return dict(
+                self._counters,
+                size=self._size,
+                idle=idle,
+                in_use=self._size - idle,
+                max_size=self.max_size
+            )
+
+    def close(self):
+        """Close every idle connection (in-use ones are closed on release)."""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        self._close_all(idle)
+
+    def _reserve(self, deadline):
+        """Pick an idle entry or claim a slot for a new one (returns None)."""
+        with self._cond:
+            self._counters["checkouts"] += 1
+            while True:
+                stale = self._evict_idle()
+                if self._idle:
+                    return self._idle.pop(), stale
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, stale
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters["timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"No database connection available within {self.timeout}s "
+                        f"(pool size {self.max_size})."
+                    )
+                self._counters["waits"] += 1
+                self._cond.wait(remaining)
+
+    def _evict_idle(self):
+        """Detach idle entries past their idle timeout or lifetime (lock held)."""
+        now = time.monotonic()
+        stale = []
+        keep = deque()
+        while self._idle:
+            entry = self._idle.popleft()
+            too_old = now - entry.created_at > self.max_lifetime
+            too_idle = (now - entry.last_used > self.idle_timeout
+                        and self._size - len(stale) > self.min_size)
+            if too_old or too_idle:
+                stale.append(entry)
+            else:
+                keep.append(entry)
+        self._idle = keep
+        return stale
+
+    def _is_healthy(self, entry):
+        if time.monotonic() - entry.last_used < self.ping_interval:
+            return True
+        try:
+            entry.conn.ping(reconnect=False)
+            return True
+        except Exception:
+            with self._cond:
+                self._counters["failed_health_checks"] += 1
+            return False
+
+    def _create(self):
+        try:
+            entry = _PoolEntry(self.factory())
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._counters["created"] += 1
+        return entry
+
+    def _close_all(self, entries, release_slots=True):
+        if not entries:
+            return
+        for entry in entries:
+            try:
+                entry.conn.close()
+            except Exception:
+                logger.debug("Ignoring error while closing pooled connection", exc_info=True)
+        with self._cond:
+            self._counters["closed"] += len(entries)
+            if release_slots:
+                self._size -= len(entries)
+                self._cond.notify(len(entries))
+
+# -------------------------------
+# 🔀 Read Replicas
+# -------------------------------
+# Client error codes meaning the server could not be reached or went away
+_CONNECTION_ERRORS = {
+    CR.CR_CONNECTION_ERROR, CR.CR_CONN_HOST_ERROR, CR.CR_SERVER_GONE_ERROR,
+    CR.CR_SERVER_LOST, ER.CON_COUNT_ERROR
+}
+
+# Session whose reads are being routed; writes in it pin its reads to the primary
+_read_scope: contextvars.ContextVar = contextvars.ContextVar("read_scope", default=None)
+
+
+@dataclass(frozen=True)
+class DBEndpoint:
+    """A MySQL server (and database) that is not the primary: a replica or a shard."""
+    host: str
+    port: int = 3306
+    db: Optional[str] = None
+
+    @staticmethod
+    def parse(spec):
+        """Accept "host", "host:port", ``{"host": ..., "port": ..., "db": ...}`` or an endpoint."""
+        if isinstance(spec, DBEndpoint):
+            return spec
+        if isinstance(spec, dict):
+            return DBEndpoint(spec["host"], int(spec.get("port") or DBConfig.PORT), spec.get("db"))
+        host, _, port = str(spec).partition(":")
+        return DBEndpoint(host, int(port) if port else DBConfig.PORT)
+
+    @property
+    def name(self):
+        return f"{self.host}:{self.port}" + (f"/{self.db}" if self.db else "")
+
+    def create_pool(self):
+        return DBConfig.create_pool(lambda: DBConfig.create_connection(self.host, self.port, self.db))
+
+
+class Replica:
+    """One read endpoint with its own pool, health flag and latency average."""
+
+    def __init__(self, endpoint, pool):
+        self.endpoint = endpoint
+        self.pool = pool
+        self.healthy = True
+        self.latency = None  # moving average of read times, seconds
+        self.lag = None
+        self.reads = 0
+        self.failures = 0
+        self.last_error = None
+
+    @property
+    def name(self):
+        return self.endpoint.name
+
+    def stats(self):
+        return {
+            "replica": self.name,
+            "healthy": self.healthy,
+            "latency_ms": None if self.latency is None else round(self.latency * 1000, 3),
+            "lag_s": self.lag,
+            "reads": self.reads,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "pool": self.pool.stats(),
+        }
+
+
+class ReadRouter:
+    """Chooses where a read runs: a healthy replica, or else the primary.
+
+    ``round_robin`` rotates over the healthy replicas; ``least_latency``
+    takes the one with the lowest moving average of read times. A replica
+    that fails with a connection error is marked down and skipped until a
+    background health check, every ``check_interval`` seconds, reaches it
+    again; with ``max_lag`` set the check also takes replicas further
+    behind than that out of rotation. A session that wrote within
+    ``DBConfig.READ_AFTER_WRITE_WINDOW`` seconds reads from the primary, so
+    it always sees its own writes. Without replicas every read goes to the
+    primary, as before.
+    """
+    STRATEGIES = ("round_robin", "least_latency")
+    LATENCY_SMOOTHING = 0.2
+    MAX_PINNED_SESSIONS = 10000
+
+    _pins = {}  # session scope -> monotonic time its reads may leave the primary
+    _pins_lock = threading.Lock()
+
+    def __init__(self, endpoints, strategy="round_robin", check_interval=5, max_lag=None):
+        if strategy not in ReadRouter.STRATEGIES:
+            raise ValueError(f"Unknown read strategy {strategy!r}; use one of {', '.join(ReadRouter.STRATEGIES)}.")
+        self.strategy = strategy
+        self.check_interval = check_interval
+        self.max_lag = max_lag
+        self.replicas = [Replica(endpoint, endpoint.create_pool()) for endpoint in endpoints]
+        self._next = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._checker = None
+
+    def choose(self):
+        """Return the replica for the next read, or None to read from the primary."""
+        if not self.replicas or ReadRouter.pinned():
+            return None
+        self._start_checker()
+        with self._lock:
+            healthy = [replica for replica in self.replicas if replica.healthy]
+            if not healthy:
+                return None
+            if self.strategy == "least_latency":
+                # Replicas without a measurement yet go first so they get one
+                return min(healthy, key=lambda replica: replica.latency or 0.0)
+            self._next = (self._next + 1) % len(healthy)
+            return healthy[self._next]
+
+    def observe(self, replica, elapsed):
+        """Fold one successful read's duration into the replica's latency average."""
+        with self._lock:
+            replica.reads += 1
+            if replica.latency is None:
+                replica.latency = elapsed
+            else:
+                replica.latency += ReadRouter.LATENCY_SMOOTHING * (elapsed - replica.latency)
+
+    def mark_down(self, replica, error):
+        with self._lock:
+            replica.failures += 1
+            replica.last_error = str(error)
+            was_healthy, replica.healthy = replica.healthy, False
+        if was_healthy:
+            logger.warning("Read replica %s marked down: %s", replica.name, error)
+
+    def check(self, replica):
+        """Probe one replica (and its lag if ``max_lag`` is set); return whether it is usable."""
+        started = time.perf_counter()
+        try:
+            with replica.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    if self.max_lag is None:
+                        DBHelper.run(cursor, "SELECT 1")
+                        lag = None
+                    else:
+                        DBHelper.run(cursor, "SHOW REPLICA STATUS")
+                        status = cursor.fetchone() or {}
+                        lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+        except Exception as e:
+            self.mark_down(replica, e)
+            return False
+
+        replica.lag = lag
+        if self.max_lag is not None and (lag is None or lag > self.max_lag):
+            # None means replication is stopped
+            self.mark_down(replica, f"replication lag {lag}s exceeds {self.max_lag}s")
+            return False
+        self.observe(replica, time.perf_counter() - started)
+        with self._lock:
+            was_healthy, replica.healthy = replica.healthy, True
+        if not was_healthy:
+            logger.info("Read replica %s is back in rotation", replica.name)
+        return True
+
+    def check_all(self):
+        return {replica.name: self.check(replica) for replica in self.replicas}
+
+    def stats(self):
+        return [replica.stats() for replica in self.replicas]
+
+    def close(self):
+        """Stop the health checks and close the replicas' idle connections."""
+        self._stop.set()
+        for replica in self.replicas:
+            replica.pool.close()
+
+    def _start_checker(self):
+        if self._checker is not None:
+            return
+        with self._lock:
+            if self._checker is None:
+                self._checker = threading.Thread(
+                    target=self._run_checks, name="replica-health", daemon=True
+                )
+                self._checker.start()
+
+    def _run_checks(self):
+        while not self._stop.wait(self.check_interval):
+            try:
+                self.check_all()
+            except Exception:
+                logger.exception("Replica health check failed")
+
+    @staticmethod
+    def is_connection_error(error):
+        if isinstance(error, pymysql.err.InterfaceError):
+            return True
+        return (isinstance(error, pymysql.err.OperationalError)
+                and bool(error.args) and error.args[0] in _CONNECTION_ERRORS)
+
+    @staticmethod
+    def bind(scope):
+        """Route the current context's reads as session ``scope``; returns a reset token."""
+        return _read_scope.set(scope)
+
+    @staticmethod
+    def release(token):
+        _read_scope.reset(token)
+
+    @staticmethod
+    def scope():
+        """The session scope bound to the current context, if any."""
+        return _read_scope.get()
+
+    @staticmethod
+    def note_write():
+        """Pin the current session's reads to the primary for the read-after-write window."""
+        scope = _read_scope.get()
+        if scope is None or not DBConfig.REPLICAS:
+            return
+        until = time.monotonic() + DBConfig.READ_AFTER_WRITE_WINDOW
+        with ReadRouter._pins_lock:
+            pins = ReadRouter._pins
+            if len(pins) >= ReadRouter.MAX_PINNED_SESSIONS and scope not in pins:
+                now = time.monotonic()
+                ReadRouter._pins = pins = {key: t for key, t in pins.items() if t > now}
+            pins[scope] = until
+
+    @staticmethod
+    def pinned(scope=None):
+        scope = scope if scope is not None else _read_scope.get()
+        if scope is None:
+            return False
+        until = ReadRouter._pins.get(scope)
+        return until is not None and time.monotonic() < until
+
+# -------------------------------
+# 🧩 Shards
+# -------------------------------
+class ShardRouter:
+    """Maps a username to the shard database holding that user's rows.
+
+    A username hashes (CRC32 of its normalized form) to one of
+    ``DBConfig.SHARD_BUCKETS`` buckets, and ``DBConfig.SHARD_MAP`` assigns
+    bucket ranges to the shards named in ``DBConfig.SHARDS``; the hash
+    never changes, so moving load means reassigning buckets. The
+    ``shard_directory`` table on the primary overrides the hash for single
+    users (reshard.py writes it while moving them); entries are cached for
+    ``SHARD_DIRECTORY_TTL`` seconds. With no shards configured every
+    lookup returns None, which the db layer reads as "the primary".
+    """
+    _pools = {}
+    _pools_lock = threading.Lock()
+    _directory = {}  # normalized username -> (shard or None, expires at)
+
+    @staticmethod
+    def enabled():
+        return bool(DBConfig.SHARDS)
+
+    @staticmethod
+    def names():
+        return sorted(DBConfig.SHARDS)
+
+    @staticmethod
+    def bucket(username):
+        return zlib.crc32(User.normalize(username).encode("utf-8")) % DBConfig.SHARD_BUCKETS
+
+    @staticmethod
+    def shard_map(mapping=None):
+        """Return the ``[(first_bucket, name), ...]`` map in use, checked and sorted."""
+        names = ShardRouter.names()
+        mapping = mapping if mapping is not None else DBConfig.SHARD_MAP
+        if mapping is None:
+            return [(i * DBConfig.SHARD_BUCKETS // len(names), name) for i, name in enumerate(names)]
+        mapping = sorted((int(first), name) for first, name in mapping)
+        unknown = {name for _, name in mapping} - set(names)
+        if unknown:
+            raise ValueError(f"Shard map names unknown shard(s): {', '.join(sorted(unknown))}.")
+        if not mapping or mapping[0][0] != 0:
+            raise ValueError("Shard map must start at bucket 0.")
+        return mapping
+
+    @staticmethod
+    def hashed_shard(username, mapping=None):
+        """The shard the hash assigns ``username`` to, ignoring directory overrides."""
+        if not ShardRouter.enabled():
+            return None
+        mapping = ShardRouter.shard_map(mapping)
+        index = bisect.bisect_right([first for first, _ in mapping], ShardRouter.bucket(username)) - 1
+        return mapping[index][1]
+
+    @staticmethod
+    def shard_for(username):
+        """The shard holding ``username``'s rows, or None when sharding is off."""
+        if not ShardRouter.enabled():
+            return None
+        return ShardRouter.override(username) or ShardRouter.hashed_shard(username)
+
+    @staticmethod
+    def override(username):
+        key = User.normalize(username)
+        cached = ShardRouter._directory.get(key)
+        if cached is not None and cached[1] > time.monotonic():
+            return cached[0]
+        row = DBHelper.fetch_one(
+            "SELECT shard FROM shard_directory WHERE username = %s", (key,), primary=True
+        )
+        shard = row['shard'] if row else None
+        ShardRouter._directory[key] = (shard, time.monotonic() + DBConfig.SHARD_DIRECTORY_TTL)
+        return shard
+
+    @staticmethod
+    def set_override(username, shard):
+        """Pin ``username`` to ``shard`` (None removes the override)."""
+        key = User.normalize(username)
+        if shard is None:
+            DBHelper.execute("DELETE FROM shard_directory WHERE username = %s", (key,))
+        else:
+            if shard not in DBConfig.SHARDS:
+                raise ValueError(f"Unknown shard {shard!r}.")
+            DBHelper.execute("""
+                INSERT INTO shard_directory (username, shard) VALUES (%s, %s)
+                ON DUPLICATE KEY UPDATE shard = VALUES(shard)
+            """, (key, shard))
+        ShardRouter._directory.pop(key, None)
+
+    @staticmethod
+    def get_pool(shard):
+        """Return the connection pool of a shard (None is the primary)."""
+        if shard is None:
+            return DBConfig.get_pool()
+        pool = ShardRouter._pools.get(shard)
+        if pool is None:
+            with ShardRouter._pools_lock:
+                pool = ShardRouter._pools.get(shard)
+                if pool is None:
+                    if shard not in DBConfig.SHARDS:
+                        raise ValueError(f"Unknown shard {shard!r}.")
+                    pool = ShardRouter._pools[shard] = DBEndpoint.parse(DBConfig.SHARDS[shard]).create_pool()
+        return pool
+
+    @staticmethod
+    def connection(shard):
+        return ShardRouter.get_pool(shard).connection()
+
+    @staticmethod
+    def all_shards():
+        """Every database holding per-user rows: the shards, or just the primary (None)."""
+        return ShardRouter.names() or [None]
+
 # -------------------------------
 # 🔄 Low-level DB Operations
 # -------------------------------
+@dataclass
+class QueryResult:
+    """Outcome of one query in a ``DBHelper.fetch_many`` batch."""
+    rows: Any = None
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
 class DBHelper:
+    FANOUT_WORKERS = 8
+    FANOUT_TIMEOUT = 10
+    STREAM_CHUNK_SIZE = 1000
+
+    _executor = None
+    _executor_lock = threading.Lock()
+
     @staticmethod
-    def fetch_all(query, params=None):
-        """Execute a SELECT query and return all results."""
-        with DBConfig.get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, params or ())
-                return cursor.fetchall()
+    def run(cursor, query, params=None, many=False):
+        """Execute one statement on ``cursor``, timed and recorded in QueryLog.
+
+        Every query in utils.py goes through here; ``many=True`` runs
+        ``cursor.executemany(query, params)``. In a traced rerun the
+        statement also becomes a child span.
+        """
+        started = time.perf_counter()
+        failed = True
+        # Unbuffered cursors return before the rows are read; their rowcount is meaningless
+        unbuffered = isinstance(cursor, pymysql.cursors.SSCursor)
+        try:
+            if many:
+                result = cursor.executemany(query, params)
+            else:
+                result = cursor.execute(query, params or ())
+            failed = False
+            return result
+        finally:
+            elapsed = time.perf_counter() - started
+            rows = 0 if failed or unbuffered else max(cursor.rowcount or 0, 0)
+            QueryLog.record(query, elapsed, rows, failed)
+            if Tracer.active():
+                statement = fingerprint(query)
+                Tracer.add_span(statement[:80], "db", started, elapsed,
+                                statement=statement, rows=rows, error=failed)
+
+    # ``shard`` (a ShardRouter name) sends a statement to that shard instead
+    # of the primary; shards are read directly, without replicas
 
     @staticmethod
-    def fetch_one(query, params=None):
-        """Execute a SELECT query and return one result."""
-        with DBConfig.get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, params or ())
-                return cursor.fetchone()
+    def fetch_all(query, params=None, primary=False, shard=None):
+        """Execute a SELECT query and return all results (on a replica unless ``primary``)."""
+        return DBHelper._read(query, params, "all", primary, shard)
 
     @staticmethod
-    def execute(query, params=None):
+    def fetch_one(query, params=None, primary=False, shard=None):
+        """Execute a SELECT query and return one result (on a replica unless ``primary``)."""
+        return DBHelper._read(query, params, "one", primary, shard)
+
+    @staticmethod
+    def execute(query, params=None, shard=None):
         """Execute an INSERT/UPDATE/DELETE query."""
-        with DBConfig.get_connection() as conn:
+        with ShardRouter.connection(shard) as conn:
             with conn.cursor() as cursor:
-                cursor.execute(query, params or ())
+                DBHelper.run(cursor, query, params)
+        ReadRouter.note_write()
+
+    @staticmethod
+    def _read(query, params, mode, primary, shard=None):
+        if shard is not None:
+            with ShardRouter.connection(shard) as conn:
+                return DBHelper._fetch(conn, query, params, mode)
+        # A replica that cannot be reached is marked down and the read retried on the primary
+        router = DBConfig.get_router()
+        replica = None if primary else router.choose()
+        if replica is not None:
+            started = time.perf_counter()
+            try:
+                with replica.pool.connection() as conn:
+                    rows = DBHelper._fetch(conn, query, params, mode)
+            except PoolTimeoutError:
+                pass
+            except (pymysql.err.OperationalError, pymysql.err.InterfaceError) as e:
+                if not ReadRouter.is_connection_error(e):
+                    raise
+                router.mark_down(replica, e)
+            else:
+                router.observe(replica, time.perf_counter() - started)
+                return rows
+        with DBConfig.get_connection() as conn:
+            return DBHelper._fetch(conn, query, params, mode)
+
+    @staticmethod
+    def _fetch(conn, query, params, mode):
+        with conn.cursor() as cursor:
+            DBHelper.run(cursor, query, params)
+            return cursor.fetchone() if mode == "one" else cursor.fetchall()
+
+    @staticmethod
+    def stream(query, params=None, chunk_size=None, shard=None):
+        """Yield the rows of a SELECT in lists of ``chunk_size``, with constant memory.
+
+        Uses an unbuffered server-side cursor (SSDictCursor) on a pooled
+        connection, which stays busy until the generator finishes. If the
+        caller stops early, the connection is closed rather than drained,
+        since the unread rows would otherwise all have to be read first.
+        Streams of the primary run on a replica when one is healthy.
+        """
+        chunk_size = chunk_size or DBHelper.STREAM_CHUNK_SIZE
+        replica = DBConfig.get_router().choose() if shard is None else None
+        lease = replica.pool.connection() if replica else ShardRouter.connection(shard)
+        conn = lease.__enter__()
+        exhausted = False
+        error = None
+        cursor = None
+        try:
+            cursor = conn.cursor(pymysql.cursors.SSDictCursor)
+            DBHelper.run(cursor, query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+            exhausted = True
+            cursor.close()
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if not exhausted:
+                if cursor is not None:
+                    cursor.connection = None  # SSCursor.close() would drain the unread rows
+                lease.discard()
+            lease.__exit__(type(error) if error else None, error, None)
+
+    @staticmethod
+    def fetch_many(queries, timeout=None):
+        """Run independent SELECTs concurrently and return all results together.
+
+        ``queries`` maps a name to ``(query, params)`` for all rows, or to
+        ``(query, params, "one")`` for a single row. Every name gets a
+        QueryResult; a failing or slow query only sets its own ``error``.
+        ``timeout`` (seconds) bounds each query, also server-side through a
+        MAX_EXECUTION_TIME hint.
+        """
+        timeout = timeout or DBHelper.FANOUT_TIMEOUT
+        executor = DBHelper._get_executor()
+        # Each worker runs in a copy of the caller's context, so its queries
+        # count towards the caller's rerun in QueryLog
+        futures = {
+            name: executor.submit(contextvars.copy_context().run, DBHelper._timed_fetch, spec, timeout)
+            for name, spec in queries.items()
+        }
+        wait(futures.values(), timeout=timeout)
+
+        results = {}
+        for name, future in futures.items():
+            if not future.done():
+                future.cancel()
+                results[name] = QueryResult(
+                    error=TimeoutError(f"Query '{name}' exceeded {timeout}s"),
+                    elapsed=timeout
+                )
+            elif future.exception() is not None:
+                results[name] = QueryResult(error=future.exception())
+            else:
+                results[name] = future.result()
+        return results
+
+    @staticmethod
+    def _get_executor():
+        if DBHelper._executor is None:
+            with DBHelper._executor_lock:
+                if DBHelper._executor is None:
+                    DBHelper._executor = ThreadPoolExecutor(
+                        max_workers=DBHelper.FANOUT_WORKERS,
+                        thread_name_prefix="db-fanout"
+                    )
+        return DBHelper._executor
+
+    @staticmethod
+    def _timed_fetch(spec, timeout):
+        query, params = spec[0], spec[1]
+        mode = spec[2] if len(spec) > 2 else "all"
+        stripped = query.lstrip()
+        if stripped[:6].upper() == "SELECT":
+            query = f"SELECT /*+ MAX_EXECUTION_TIME({int(timeout * 1000)}) */{stripped[6:]}"
+        started = time.perf_counter()
+        try:
+            fetch = DBHelper.fetch_one if mode == "one" else DBHelper.fetch_all
+            rows = fetch(query, params)
+        except Exception as e:
+            return QueryResult(error=e, elapsed=time.perf_counter() - started)
+        return QueryResult(rows=rows, elapsed=time.perf_counter() - started)
+
+# -------------------------------
+# 🧾 Unit of Work
+# -------------------------------
+class UnitOfWork:
+    """Run several statements as one transaction on a pooled connection.
+
+        with UnitOfWork() as uow:
+            uow.execute("INSERT INTO orders ...", params)
+            uow.executemany("INSERT INTO order_items ...", rows)
+
+    Commits when the block exits normally and rolls back on any exception.
+    ``executemany`` on an INSERT/REPLACE is sent as multi-row VALUES.
+    ``UnitOfWork(shard)`` runs the transaction on a shard instead of the
+    primary.
+    """
+
+    def __init__(self, shard=None):
+        self.shard = shard
+        self._lease = None
+        self.conn = None
+        self.cursor = None
+
+    def __enter__(self):
+        self._lease = ShardRouter.connection(self.shard)
+        self.conn = self._lease.__enter__()
+        try:
+            self.conn.begin()
+            self.cursor = self.conn.cursor()
+        except BaseException as e:
+            self._lease.__exit__(type(e), e, e.__traceback__)
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        error = exc
+        try:
+            self.cursor.close()
+            if exc_type is None:
+                self.conn.commit()
+                ReadRouter.note_write()
+            else:
+                self.conn.rollback()
+        except Exception as e:
+            error = e
+            try:
+                self.conn.rollback()
+            except Exception:
+                logger.debug("Rollback after failed commit also failed", exc_info=True)
+            raise
+        finally:
+            self._lease.__exit__(type(error) if error else None, error, None)
+        return False
+
+    @property
+    def lastrowid(self):
+        return self.cursor.lastrowid
+
+    def execute(self, query, params=None):
+        """Execute one statement and return the affected row count."""
+        return DBHelper.run(self.cursor, query, params)
+
+    def executemany(self, query, rows, batch_size=None):
+        """Execute a statement for many rows, optionally in fixed-size batches."""
+        rows = list(rows)
+        if not rows:
+            return 0
+        batch_size = batch_size or len(rows)
+        affected = 0
+        for start in range(0, len(rows), batch_size):
+            affected += DBHelper.run(self.cursor, query, rows[start:start + batch_size], many=True) or 0
+        return affected
+
+    # Reads inside a unit of work stay on its (primary) connection
+    def fetch_all(self, query, params=None):
+        DBHelper.run(self.cursor, query, params)
+        return self.cursor.fetchall()
+
+    def fetch_one(self, query, params=None):
+        DBHelper.run(self.cursor, query, params)
+        return self.cursor.fetchone()
 
 # -------------------------------
 # 👤 User Management
 # -------------------------------
+class DuplicateUserError(Exception):
+    """Raised when a username or email is already registered."""
+
+
 class User:
+    SYNC_BATCH_SIZE = 500
+
     @staticmethod
     def load_users():
-        """Load all users from the database."""
+        """Load all users from the database (admin/bulk use only)."""
         users = DBHelper.fetch_all("SELECT * FROM users")
         return {u['username']: u for u in users}
 
     @staticmethod
-    def save_users(user_data):
-        """Insert or update user data in the database."""
-        with DBConfig.get_connection() as conn:
-            with conn.cursor() as cursor:
-                for username, data in user_data.items():
-                    cursor.execute("""
-                        REPLACE INTO users (username, email, password, role)
-                        VALUES (%s, %s, %s, %s)
-                    """, (
-                        username,
-                        data['email'],
-                        data['password'],
-                        data.get('role', 'user')
-                    ))
+    def normalize(identifier):
+        """Normalize a username or email for lookups.
+
+        The username/email columns use a case-insensitive collation, so the
+        lowercased value still hits their unique indexes.
+        """
+        return (identifier or "").strip().lower()
+
+    @staticmethod
+    def find_by_login(identifier):
+        """Fetch one user by username or email via the unique indexes."""
+        identifier = User.normalize(identifier)
+        if not identifier:
+            return None
+        # Two point lookups instead of an OR so each side uses its own index
+        return DBHelper.fetch_one("""
+            (SELECT * FROM users WHERE username = %s LIMIT 1)
+            UNION ALL
+            (SELECT * FROM users WHERE email = %s LIMIT 1)
+            LIMIT 1
+        """, (identifier, identifier))
+
+    @staticmethod
+    def username_exists(username):
+        """Check whether a username is already taken."""
+        row = DBHelper.fetch_one(
+            "SELECT 1 AS found FROM users WHERE username = %s LIMIT 1",
+            (User.normalize(username),)
+        )
+        return row is not None
+
+    @staticmethod
+    def email_exists(email):
+        """Check whether an email is already registered."""
+        row = DBHelper.fetch_one(
+            "SELECT 1 AS found FROM users WHERE email = %s LIMIT 1",
+            (User.normalize(email),)
+        )
+        return row is not None
+
+    @staticmethod
+    def create_user(username, email, password, role='user'):
+        """Insert exactly one new user.
+
+        Duplicates are detected by the unique keys on username/email rather
+        than a prior read, so concurrent signups cannot both succeed.
+        """
+        try:
+            DBHelper.execute("""
+                INSERT INTO users (username, email, password, role)
+                VALUES (%s, %s, %s, %s)
+            """, (username, email, password, role))
+        except pymysql.err.IntegrityError as e:
+            if e.args and e.args[0] == ER.DUP_ENTRY:
+                raise DuplicateUserError("Username or email is already registered.") from e
+            raise
+
+    @staticmethod
+    def save_users(user_data, batch_size=None):
+        """Bulk-sync users: upsert every entry, a batch of rows per statement."""
+        rows = [
+            (username, data['email'], data['password'], data.get('role', 'user'))
+            for username, data in user_data.items()
+        ]
+        with UnitOfWork() as uow:
+            uow.executemany("""
+                INSERT INTO users (username, email, password, role)
+                VALUES (%s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    email = VALUES(email),
+                    password = VALUES(password),
+                    role = VALUES(role)
+            """, rows, batch_size=batch_size or User.SYNC_BATCH_SIZE)
 
 # -------------------------------
 # 💊 Medicine Management
 # -------------------------------
 class Medicine:
+    COLUMNS = ("id", "name", "description", "category", "price", "stock",
+               "expiry_date", "manufacturer", "requires_prescription")
+
+    @staticmethod
+    def upsert_many(uow, rows):
+        """Insert or update many medicines (tuples in COLUMNS order) in ``uow``.
+
+        Sent as multi-row INSERT ... ON DUPLICATE KEY UPDATE; rows with a
+        NULL id are inserted as new medicines. The catalog snapshot is not
+        touched, so callers invalidate it once they are done.
+        """
+        columns = ", ".join(Medicine.COLUMNS)
+        placeholders = ", ".join(["%s"] * len(Medicine.COLUMNS))
+        updates = ", ".join(f"{col} = VALUES({col})" for col in Medicine.COLUMNS[1:])
+        return uow.executemany(
+            f"INSERT INTO medicines ({columns}) VALUES ({placeholders}) "
+            f"ON DUPLICATE KEY UPDATE {updates}",
+            rows
+        )
+
+    @staticmethod
+    def iter_all(chunk_size=None):
+        """Stream every medicine row (for exports; the app reads the Catalog)."""
+        for rows in DBHelper.stream("SELECT * FROM medicines ORDER BY id", chunk_size=chunk_size):
+            yield from rows
+
     @staticmethod
     def save_medicine(med):
         """Save or update a medicine record."""
-        with DBConfig.get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    REPLACE INTO medicines (
-                        id, name, description, category, price, stock, expiry_date,
-                        manufacturer, requires_prescription
-                    ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (
-                    med.get('id'),
-                    med['name'],
-                    med['description'],
-                    med['category'],
-                    med['price'],
-                    med['stock'],
-                    med['expiry_date'],
-                    med['manufacturer'],
-                    int(med.get('requires_prescription', False))
-                ))
+        with UnitOfWork() as uow:
+            uow.execute("""
+                REPLACE INTO medicines (
+                    id, name, description, category, price, stock, expiry_date,
+                    manufacturer, requires_prescription
+                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (
+                med.get('id'),
+                med['name'],
+                med['description'],
+                med['category'],
+                med['price'],
+                med['stock'],
+                med['expiry_date'],
+                med['manufacturer'],
+                int(med.get('requires_prescription', False))
+            ))
+            # Patch the catalog with the row as stored, not the form's strings
+            row = uow.fetch_one("SELECT * FROM medicines WHERE id = %s",
+                                (med.get('id') or uow.lastrowid,))
+        Catalog.apply_write(row)
+
+# -------------------------------
+# 📚 Catalog Snapshot
+# -------------------------------
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Immutable, process-wide view of the medicines table."""
+    version: int
+    loaded_at: float
+    medicines: tuple
+    by_id: MappingProxyType
+    positions: MappingProxyType  # id -> index in ``medicines``
+    categories: tuple
+    search_index: SearchIndex
+    expiry: "ExpiryTable"
+
+
+class Catalog:
+    """Shares one catalog snapshot between all sessions.
+
+    The snapshot is reloaded once it is older than ``TTL`` seconds (other
+    sessions keep reading the previous one meanwhile). Single-row writes are
+    patched in with ``apply_write()``, which derives a new snapshot and
+    search index and leaves the old ones untouched; bulk changes call
+    ``invalidate()`` to force a reload.
+    """
+    TTL = 60
+
+    _snapshot = None
+    _last = None
+    _version = 0
+    _generation = 0
+    _written_at = float("-inf")
+    _lock = threading.Lock()
+
+    @staticmethod
+    def snapshot():
+        """Return the current catalog snapshot, loading it if needed."""
+        snap = Catalog._snapshot
+        if snap is not None and not Catalog._expired(snap):
+            return snap
+        if snap is not None and not Catalog._lock.acquire(blocking=False):
+            return snap  # another session is already refreshing it
+        if snap is None:
+            Catalog._lock.acquire()
+        try:
+            current = Catalog._snapshot
+            if current is not None and current is not snap and not Catalog._expired(current):
+                return current
+            return Catalog._load()
+        finally:
+            Catalog._lock.release()
+
+    @staticmethod
+    def invalidate():
+        """Drop the shared snapshot so the next reader reloads it."""
+        Catalog._generation += 1
+        Catalog._written_at = time.monotonic()
+        Catalog._snapshot = None
+
+    @staticmethod
+    def apply_write(row):
+        """Patch one medicine row, as read back from the database, into the shared snapshot."""
+        with Catalog._lock:
+            Catalog._generation += 1
+            Catalog._written_at = time.monotonic()
+            snap = Catalog._snapshot
+            if snap is None or row is None:
+                return
+            row = MappingProxyType(dict(row))
+            med_id = row.get('id')
+            old = snap.by_id.get(med_id)
+            positions = snap.positions
+            if old is None:
+                medicines = snap.medicines + (row,)
+                positions = dict(positions)
+                positions[med_id] = len(snap.medicines)
+                positions = MappingProxyType(positions)
+            else:
+                at = positions[med_id]
+                medicines = snap.medicines[:at] + (row,) + snap.medicines[at + 1:]
+            by_id = dict(snap.by_id)
+            by_id[med_id] = row
+
+            categories = set(snap.categories)
+            categories.add(row.get('category') or 'Other')
+            old_category = (old.get('category') or 'Other') if old is not None else None
+            if old_category not in (None, row.get('category') or 'Other') and not any(
+                (med.get('category') or 'Other') == old_category for med in medicines
+            ):
+                categories.discard(old_category)
+
+            Catalog._version += 1
+            Catalog._snapshot = Catalog._last = CatalogSnapshot(
+                version=Catalog._version,
+                loaded_at=snap.loaded_at,
+                medicines=medicines,
+                by_id=MappingProxyType(by_id),
+                positions=positions,
+                categories=tuple(sorted(categories)),
+                search_index=snap.search_index.replaced(row),
+                expiry=snap.expiry.with_value(med_id, row.get('expiry_date'))
+            )
+
+    @staticmethod
+    def is_current(version):
+        """Tell whether a snapshot version is still the live one."""
+        snap = Catalog._snapshot
+        return snap is not None and snap.version == version and not Catalog._expired(snap)
+
+    @staticmethod
+    def _expired(snap):
+        return time.monotonic() - snap.loaded_at > Catalog.TTL
+
+    @staticmethod
+    def _load():
+        generation = Catalog._generation
+        # Right after a catalog write a replica may not have it yet; the snapshot is shared
+        recent_write = time.monotonic() - Catalog._written_at < DBConfig.READ_AFTER_WRITE_WINDOW
+        rows = DBHelper.fetch_all("SELECT * FROM medicines", primary=recent_write)
+        medicines = tuple(MappingProxyType(dict(row)) for row in rows)
+        last = Catalog._last
+        if last is not None and last.medicines == medicines:
+            # Unchanged data keeps its version, search index and expiry table
+            snap = Catalog._build(
+                medicines, last.version, time.monotonic(), last.search_index, last.expiry
+            )
+        else:
+            from expiry import ExpiryTable  # NumPy is only needed once a catalog loads
+            Catalog._version += 1
+            snap = Catalog._build(
+                medicines, Catalog._version, time.monotonic(), SearchIndex(medicines),
+                ExpiryTable(
+                    (med.get('id') for med in medicines),
+                    (med.get('expiry_date') for med in medicines)
+                )
+            )
+        # A write that landed while we were loading makes this snapshot stale
+        if generation == Catalog._generation:
+            Catalog._snapshot = snap
+            Catalog._last = snap
+        return snap
+
+    @staticmethod
+    def _build(medicines, version, loaded_at, search_index, expiry):
+        return CatalogSnapshot(
+            version=version,
+            loaded_at=loaded_at,
+            medicines=medicines,
+            by_id=MappingProxyType({med.get('id'): med for med in medicines}),
+            positions=MappingProxyType({med.get('id'): i for i, med in enumerate(medicines)}),
+            categories=tuple(sorted({med.get('category') or 'Other' for med in medicines})),
+            search_index=search_index,
+            expiry=expiry
+        )
 
 # -------------------------------
 # 📦 Orders
 # -------------------------------
+class InsufficientStockError(Exception):
+    """Raised when an order asks for more units than are in stock."""
+
+    def __init__(self, requested, short=None):
+        self.requested = requested
+        self.short = short or []
+        names = ", ".join(line['name'] for line in self.short) or "some items"
+        super().__init__(f"Not enough stock for {names}.")
+
+
 class Order:
+    HISTORY_PAGE_SIZE = 10
+
     @staticmethod
     def insert_order(order):
-        """Insert a new order along with its items."""
-        with DBConfig.get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO orders (user, total, address, datetime)
-                    VALUES (%s, %s, %s, %s)
-                """, (
-                    order['user'],
-                    order['total'],
-                    order['address'],
-                    order['datetime']
-                ))
-                order_id = cursor.lastrowid
-
-                for item in order['items']:
-                    cursor.execute("""
-                        INSERT INTO order_items (
-                            order_id, medicine_id, medicine_name, qty, price, expiry_date
-                        ) VALUES (%s, %s, %s, %s, %s, %s)
-                    """, (
-                        order_id,
-                        item.get('id', 0),
-                        item['name'],
-                        item['qty'],
-                        item['price'],
-                        item.get('expiry_date')
-                    ))
-                return order_id
+        """Insert a new order and all of its items in one transaction.
+
+        Stock for every line is reserved in the same transaction; if any line
+        would go negative nothing is written and InsufficientStockError is
+        raised. The sales rollups are updated in the same transaction too.
+        With shards, see ``_insert_sharded``.
+        """
+        shard = ShardRouter.shard_for(order['user'])
+        try:
+            if shard is not None:
+                return Order._insert_sharded(order, shard)
+            with UnitOfWork() as uow:
+                order_id = Order.place(uow, order)
+        except InsufficientStockError as e:
+            e.short = Order.find_short_lines(e.requested)
+            raise
+        return order_id
+
+    @staticmethod
+    def place(uow, order):
+        """Reserve stock, write the order and update the rollups inside ``uow`` (primary only)."""
+        Order.reserve_stock(uow, order['items'])
+        order_id = Order._write_order(uow, order)
+        SalesRollup.apply_order(uow, order_id)
+        return order_id
+
+    @staticmethod
+    def find_by_request_key(username, request_key):
+        """Return the id of the order submitted under ``request_key``, if it was written."""
+        row = DBHelper.fetch_one(
+            "SELECT id FROM orders WHERE request_key = %s AND user = %s",
+            (request_key, username), primary=True, shard=ShardRouter.shard_for(username)
+        )
+        return row['id'] if row else None
+
+    @staticmethod
+    def is_duplicate_request(error):
+        """Tell whether ``error`` is the unique request key rejecting a resubmitted order."""
+        return (isinstance(error, pymysql.err.IntegrityError) and bool(error.args)
+                and error.args[0] == ER.DUP_ENTRY and "request_key" in str(error.args[-1]))
+
+    @staticmethod
+    def _insert_sharded(order, shard):
+        """Write the order on its shard; stock and rollups stay on the primary.
+
+        The primary transaction (stock, rollups) commits inside the shard's
+        open transaction, so a stock shortage rolls back the shard write.
+        If the shard commit then fails, a second primary transaction puts
+        the stock and rollups back.
+        """
+        committed = None
+        try:
+            with UnitOfWork(shard) as order_uow:
+                order_id = Order._write_order(order_uow, order)
+                with UnitOfWork() as uow:
+                    Order.reserve_stock(uow, order['items'])
+                    totals = SalesRollup.totals_for_order(uow, order)
+                    totals.write(uow)
+                committed = totals
+        except Exception:
+            if committed is not None:
+                Order._compensate(order, committed)
+            raise
+        return order_id
+
+    @staticmethod
+    def _compensate(order, totals):
+        try:
+            with UnitOfWork() as uow:
+                Order.release_stock(uow, order['items'])
+                totals.write(uow, sign=-1)
+        except Exception:
+            logger.critical(
+                "Order of %s failed on its shard and its stock/rollups could not be restored; "
+                "fix by hand: %r", order['user'], order, exc_info=True
+            )
+
+    @staticmethod
+    def _requested(items):
+        requested = {}
+        for item in items:
+            med_id = item.get('id')
+            if med_id and int(item['qty']) > 0:
+                requested[med_id] = requested.get(med_id, 0) + int(item['qty'])
+        return requested
+
+    @staticmethod
+    def reserve_stock(uow, items):
+        """Decrement stock for all lines with one conditional UPDATE.
+
+        Rows are touched in id order so concurrent checkouts lock them in the
+        same order, and the ``stock >= qty`` guard makes the check-and-
+        decrement atomic without a prior SELECT.
+        """
+        requested = Order._requested(items)
+        if not requested:
+            return
+
+        ids = sorted(requested)
+        case_sql = "CASE id " + " ".join("WHEN %s THEN %s" for _ in ids) + " END"
+        case_params = [value for med_id in ids for value in (med_id, requested[med_id])]
+        id_list = ", ".join(["%s"] * len(ids))
+        updated = uow.execute(f"""
+            UPDATE medicines
+            SET stock = stock - {case_sql}
+            WHERE id IN ({id_list}) AND stock >= {case_sql}
+        """, case_params + ids + case_params)
+        if updated != len(ids):
+            raise InsufficientStockError(requested)
+
+    @staticmethod
+    def release_stock(uow, items):
+        """Give the lines' units back to stock (undoes ``reserve_stock``)."""
+        requested = Order._requested(items)
+        if not requested:
+            return
+        ids = sorted(requested)
+        case_sql = "CASE id " + " ".join("WHEN %s THEN %s" for _ in ids) + " END"
+        case_params = [value for med_id in ids for value in (med_id, requested[med_id])]
+        id_list = ", ".join(["%s"] * len(ids))
+        uow.execute(f"UPDATE medicines SET stock = stock + {case_sql} WHERE id IN ({id_list})",
+                    case_params + ids)
+
+    @staticmethod
+    def find_short_lines(requested):
+        """Report which requested lines exceed the current stock."""
+        if not requested:
+            return []
+        id_list = ", ".join(["%s"] * len(requested))
+        rows = DBHelper.fetch_all(
+            f"SELECT id, name, stock FROM medicines WHERE id IN ({id_list})",
+            list(requested)
+        )
+        found = {row['id']: row for row in rows}
+        return [
+            {
+                'id': med_id,
+                'name': found.get(med_id, {}).get('name', f"#{med_id}"),
+                'requested': qty,
+                'available': found.get(med_id, {}).get('stock', 0)
+            }
+            for med_id, qty in requested.items()
+            if found.get(med_id, {}).get('stock', 0) < qty
+        ]
+
+    @staticmethod
+    def _write_order(uow, order):
+        if order.get('request_key'):
+            # Unique per order (migration 7), so a resubmitted order cannot be written twice
+            uow.execute("""
+                INSERT INTO orders (user, total, address, datetime, request_key)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (
+                order['user'],
+                order['total'],
+                order['address'],
+                order['datetime'],
+                order['request_key']
+            ))
+        else:
+            uow.execute("""
+                INSERT INTO orders (user, total, address, datetime)
+                VALUES (%s, %s, %s, %s)
+            """, (
+                order['user'],
+                order['total'],
+                order['address'],
+                order['datetime']
+            ))
+        order_id = uow.lastrowid
+
+        uow.executemany("""
+            INSERT INTO order_items (
+                order_id, medicine_id, medicine_name, qty, price, expiry_date
+            ) VALUES (%s, %s, %s, %s, %s, %s)
+        """, [
+            (
+                order_id,
+                item.get('id', 0),
+                item['name'],
+                item['qty'],
+                item['price'],
+                item.get('expiry_date')
+            )
+            for item in order['items']
+        ])
+        return order_id
 
     @staticmethod
     def get_user_orders(username):
         """Get all orders for a specific user."""
         return DBHelper.fetch_all(
             "SELECT * FROM orders WHERE user=%s ORDER BY datetime DESC",
-            (username,)
+            (username,), shard=ShardRouter.shard_for(username)
+        )
+
+    @staticmethod
+    def get_user_orders_page(username, before=None, limit=None):
+        """Get one page of a user's orders, newest first, with their items.
+
+        ``before`` is the ``(datetime, id)`` cursor of the last order on the
+        previous page. Returns ``(orders, next_cursor)``; ``next_cursor`` is
+        None on the last page.
+        """
+        limit = limit or Order.HISTORY_PAGE_SIZE
+        shard = ShardRouter.shard_for(username)
+        seek, params = "", [username]
+        if before is not None:
+            seek = " AND (datetime < %s OR (datetime = %s AND id < %s))"
+            params += [before[0], before[0], before[1]]
+        orders = DBHelper.fetch_all(
+            f"SELECT * FROM orders WHERE user=%s{seek} ORDER BY datetime DESC, id DESC LIMIT %s",
+            params + [limit + 1], shard=shard
         )
+        has_more = len(orders) > limit
+        orders = orders[:limit]
+
+        items = Order.get_items_for_orders([order['id'] for order in orders], shard)
+        for order in orders:
+            order['items'] = items.get(order['id'], [])
+
+        next_cursor = (orders[-1]['datetime'], orders[-1]['id']) if has_more else None
+        return orders, next_cursor
+
+    @staticmethod
+    def iter_all(chunk_size=None):
+        """Stream every order line (order header joined with its items), oldest first.
+
+        With shards, each shard is streamed in turn and every row names its
+        ``shard`` (order ids are only unique within a shard).
+        """
+        for shard in ShardRouter.all_shards():
+            for rows in DBHelper.stream("""
+                SELECT o.id AS order_id, o.user, o.datetime, o.status, o.address, o.total,
+                       i.medicine_id, i.medicine_name, i.qty, i.price, i.expiry_date
+                FROM orders o
+                LEFT JOIN order_items i ON i.order_id = o.id
+                ORDER BY o.id, i.id
+            """, chunk_size=chunk_size, shard=shard):
+                if shard is not None:
+                    for row in rows:
+                        row['shard'] = shard
+                yield from rows
+
+    @staticmethod
+    def get_items_for_orders(order_ids, shard=None):
+        """Load the items of several orders in one query, grouped by order id."""
+        grouped = {order_id: [] for order_id in order_ids}
+        if not order_ids:
+            return grouped
+        id_list = ", ".join(["%s"] * len(order_ids))
+        rows = DBHelper.fetch_all(
+            f"SELECT * FROM order_items WHERE order_id IN ({id_list}) ORDER BY order_id, id",
+            list(order_ids), shard=shard
+        )
+        for row in rows:
+            grouped.setdefault(row['order_id'], []).append(row)
+        return grouped
+
+# -------------------------------
+# 📈 Sales Rollups
+# -------------------------------
+class SalesRollup:
+    """Per-day sales totals overall, per medicine and per category.
+
+    ``apply_order`` adds one order to the rollups inside the order's own
+    transaction; ``rebuild`` recomputes a date range from the raw tables.
+    Both run the same aggregate statements, filtered by order id or by day,
+    so an incremental update always matches what a rebuild would write.
+    Categories come from the medicines table at the time of aggregation.
+    """
+    REBUILD_WINDOW_DAYS = 31
+
+    # Columns summed into an existing rollup row (the others are keys or replaced)
+    COUNTERS = ("orders", "units", "revenue")
+
+    # rollup table -> aggregate INSERT ... SELECT with a {where} slot
+    STATEMENTS = {
+        "sales_daily": """
+            INSERT INTO sales_daily (day, orders, units, revenue)
+            SELECT DATE(o.datetime), COUNT(DISTINCT o.id),
+                   COALESCE(SUM(i.qty), 0), COALESCE(SUM(i.qty * i.price), 0)
+            FROM orders o
+            LEFT JOIN order_items i ON i.order_id = o.id
+            WHERE {where}
+            GROUP BY DATE(o.datetime)
+        """,
+        "sales_daily_medicine": """
+            INSERT INTO sales_daily_medicine (day, medicine_id, medicine_name, orders, units, revenue)
+            SELECT DATE(o.datetime), i.medicine_id, MAX(i.medicine_name), COUNT(DISTINCT o.id),
+                   SUM(i.qty), SUM(i.qty * i.price)
+            FROM orders o
+            JOIN order_items i ON i.order_id = o.id
+            WHERE {where}
+            GROUP BY DATE(o.datetime), i.medicine_id
+        """,
+        "sales_daily_category": """
+            INSERT INTO sales_daily_category (day, category, orders, units, revenue)
+            SELECT DATE(o.datetime), COALESCE(m.category, 'Uncategorized'), COUNT(DISTINCT o.id),
+                   SUM(i.qty), SUM(i.qty * i.price)
+            FROM orders o
+            JOIN order_items i ON i.order_id = o.id
+            LEFT JOIN medicines m ON m.id = i.medicine_id
+            WHERE {where}
+            GROUP BY DATE(o.datetime), COALESCE(m.category, 'Uncategorized')
+        """,
+    }
+
+    # rollup table -> its columns ahead of the counters (for rows summed in Python)
+    KEY_COLUMNS = {
+        "sales_daily": ("day",),
+        "sales_daily_medicine": ("day", "medicine_id", "medicine_name"),
+        "sales_daily_category": ("day", "category"),
+    }
+
+    @staticmethod
+    def _updates(table):
+        # Target columns are qualified: with INSERT ... SELECT an unqualified
+        # name that also exists in a source table (medicine_name) is ambiguous
+        updates = [f"{table}.{col} = {table}.{col} + VALUES({col})" for col in SalesRollup.COUNTERS]
+        if table == "sales_daily_medicine":
+            updates.append(f"{table}.medicine_name = VALUES(medicine_name)")
+        return f"ON DUPLICATE KEY UPDATE {', '.join(updates)}"
+
+    @staticmethod
+    def _statement(table, where):
+        return f"{SalesRollup.STATEMENTS[table].format(where=where)} {SalesRollup._updates(table)}"
+
+    @staticmethod
+    def _upsert(table):
+        columns = SalesRollup.KEY_COLUMNS[table] + SalesRollup.COUNTERS
+        return (f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({', '.join(['%s'] * len(columns))}) {SalesRollup._updates(table)}")
+
+    @staticmethod
+    def apply_order(uow, order_id):
+        """Add one just-written order to every rollup (call inside its transaction)."""
+        for table in SalesRollup.STATEMENTS:
+            uow.execute(SalesRollup._statement(table, "o.id = %s"), (order_id,))
+
+    @staticmethod
+    def totals_for_order(uow, order):
+        """Rollup rows for an order held on a shard, summed from the order itself.
+
+        Categories are read through ``uow`` on the primary, as the
+        aggregate statements would.
+        """
+        ids = sorted({item.get('id', 0) for item in order['items']})
+        id_list = ", ".join(["%s"] * len(ids))
+        rows = uow.fetch_all(f"SELECT id, category FROM medicines WHERE id IN ({id_list})", ids) if ids else []
+        totals = _RollupTotals({row['id']: row['category'] for row in rows})
+        day = date.fromisoformat(str(order['datetime'])[:10])
+        if not order['items']:
+            totals.add("order", day)
+        for item in order['items']:
+            totals.add("order", day, item.get('id', 0), item['name'], item['qty'], item['price'])
+        return totals
+
+    @staticmethod
+    def rebuild(start=None, end=None, window_days=None, progress=None):
+        """Recompute the rollups for ``start``..``end`` (dates, inclusive) from the raw tables.
+
+        Defaults to the whole order history. Works in windows of
+        ``window_days`` days, one transaction each, so a backfill of a long
+        history never holds one huge transaction. Returns the days covered.
+        """
+        window = timedelta(days=window_days or SalesRollup.REBUILD_WINDOW_DAYS)
+        if start is None or end is None:
+            first, last = SalesRollup._bounds()
+            start = start or first
+            end = end or last
+        if start is None or end is None:
+            return 0
+
+        # Sharded orders are summed shard by shard in Python; categories still come from the primary
+        sharded = ShardRouter.enabled()
+        categories = None
+        if sharded:
+            categories = {row['id']: row['category']
+                          for row in DBHelper.fetch_all("SELECT id, category FROM medicines", primary=True)}
+
+        day = start
+        while day <= end:
+            stop = min(day + window, end + timedelta(days=1))
+            totals = SalesRollup._collect(day, stop, categories) if sharded else None
+            with UnitOfWork() as uow:
+                for table in SalesRollup.STATEMENTS:
+                    uow.execute(f"DELETE FROM {table} WHERE day >= %s AND day < %s", (day, stop))
+                    if not sharded:
+                        uow.execute(
+                            SalesRollup._statement(table, "o.datetime >= %s AND o.datetime < %s"),
+                            (day, stop)
+                        )
+                if sharded:
+                    totals.write(uow)
+            if progress:
+                progress(day, stop - timedelta(days=1))
+            day = stop
+        return (end - start).days + 1
+
+    @staticmethod
+    def _bounds():
+        firsts, lasts = [], []
+        for shard in ShardRouter.all_shards():
+            row = DBHelper.fetch_one(
+                "SELECT DATE(MIN(datetime)) AS first_day, DATE(MAX(datetime)) AS last_day FROM orders",
+                shard=shard
+            ) or {}
+            if row.get('first_day') is not None:
+                firsts.append(row['first_day'])
+                lasts.append(row['last_day'])
+        return (min(firsts), max(lasts)) if firsts else (None, None)
+
+    @staticmethod
+    def _collect(start, stop, categories):
+        totals = _RollupTotals(categories)
+        for shard in ShardRouter.names():
+            # Lines of one order arrive together, which is what _RollupTotals counts orders by
+            for rows in DBHelper.stream("""
+                SELECT o.id AS order_id, DATE(o.datetime) AS day, i.id AS item_id,
+                       i.medicine_id, i.medicine_name, i.qty, i.price
+                FROM orders o
+                LEFT JOIN order_items i ON i.order_id = o.id
+                WHERE o.datetime >= %s AND o.datetime < %s
+                ORDER BY o.id
+            """, (start, stop), shard=shard):
+                for row in rows:
+                    if row['item_id'] is None:
+                        totals.add((shard, row['order_id']), row['day'])
+                    else:
+                        totals.add((shard, row['order_id']), row['day'], row['medicine_id'],
+                                   row['medicine_name'], row['qty'], row['price'])
+        return totals
+
+
+class _RollupTotals:
+    """Rollup rows summed in Python, matching SalesRollup's aggregate statements.
+
+    ``add`` takes one order line (or, without a medicine, an order that has
+    no lines); ``order_key`` identifies the order, and all lines of an
+    order must be added consecutively for it to be counted once per row.
+    """
+
+    def __init__(self, categories):
+        self.categories = categories
+        self.rows = {table: {} for table in SalesRollup.STATEMENTS}
+
+    def add(self, order_key, day, medicine_id=None, name=None, qty=None, price=None):
+        if medicine_id is None and qty is None:
+            self._add("sales_daily", (day,), (day,), order_key, 0, Decimal(0))
+            return
+        qty = int(qty or 0)
+        revenue = qty * Decimal(str(price or 0))
+        category = self.categories.get(medicine_id)
+        if category is None:
+            category = "Uncategorized"
+        self._add("sales_daily", (day,), (day,), order_key, qty, revenue)
+        self._add("sales_daily_medicine", (day, medicine_id), (day, medicine_id, name),
+                  order_key, qty, revenue)
+        self._add("sales_daily_category", (day, category), (day, category), order_key, qty, revenue)
+
+    def _add(self, table, key, leading, order_key, qty, revenue):
+        row = self.rows[table].get(key)
+        if row is None:
+            # leading columns, orders, units, revenue, last order counted
+            row = self.rows[table][key] = [leading, 0, 0, Decimal(0), None]
+        elif table == "sales_daily_medicine" and (leading[2] or "") > (row[0][2] or ""):
+            row[0] = leading  # MAX(medicine_name)
+        if row[4] != order_key:
+            row[1] += 1
+            row[4] = order_key
+        row[2] += qty
+        row[3] += revenue
+
+    def write(self, uow, sign=1):
+        """Add the rows to the rollup tables (``sign=-1`` takes them back out)."""
+        for table, rows in self.rows.items():
+            if rows:
+                uow.executemany(SalesRollup._upsert(table), [
+                    (*leading, sign * orders, sign * units, sign * revenue)
+                    for leading, orders, units, revenue, _ in rows.values()
+                ])
+
+# -------------------------------
+# 🛒 Cart Persistence
+# -------------------------------
+@dataclass
+class _PendingCart:
+    """Coalesced, not yet written cart changes of one user."""
+    clear: bool = False
+    lines: dict = field(default_factory=dict)  # medicine_id -> quantity (0 deletes the line)
+
+    def apply_to(self, saved):
+        """Overlay these changes on ``{medicine_id: qty}`` read from the database."""
+        merged = {} if self.clear else dict(saved)
+        for med_id, qty in self.lines.items():
+            if qty > 0:
+                merged[med_id] = qty
+            else:
+                merged.pop(med_id, None)
+        return merged
+
+
+class CartStore:
+    """Write-behind persistence of carts in the ``cart`` table, keyed by username.
+
+    Cart edits only update an in-memory pending map; a background thread
+    writes every pending cart in one transaction at most ``FLUSH_DELAY``
+    seconds after the first unwritten change. ``flush()`` writes
+    immediately (checkout does), and pending changes are flushed at exit.
+    """
+    FLUSH_DELAY = 2.0
+
+    _pending = {}
+    _deadline = None
+    _lock = threading.Lock()
+    _wakeup = threading.Condition(_lock)
+    _flush_lock = threading.Lock()  # one writer at a time keeps writes in order
+    _thread = None
+
+    @staticmethod
+    def record(username, medicine_id, qty):
+        """Queue a line's new quantity (0 removes it)."""
+        with CartStore._lock:
+            CartStore._pending_for(username).lines[medicine_id] = max(int(qty), 0)
+            CartStore._schedule()
+
+    @staticmethod
+    def record_clear(username):
+        with CartStore._lock:
+            CartStore._pending[username] = _PendingCart(clear=True)
+            CartStore._schedule()
+
+    @staticmethod
+    def load(username):
+        """Return ``{medicine_id: qty}`` for a user: saved rows plus pending changes."""
+        with CartStore._flush_lock:
+            # Flushes run outside any session, so a replica could still miss the last one
+            rows = DBHelper.fetch_all(
+                "SELECT medicine_id, quantity FROM cart WHERE user = %s ORDER BY id",
+                (username,), primary=True, shard=ShardRouter.shard_for(username)
+            )
+            saved = {row['medicine_id']: row['quantity'] for row in rows}
+            with CartStore._lock:
+                pending = CartStore._pending.get(username)
+                return pending.apply_to(saved) if pending else saved
+
+    @staticmethod
+    def flush(username=None):
+        """Write pending changes now (one user's, or everyone's); False if that failed.
+
+        A failed batch is kept and retried by the background flusher.
+        """
+        with CartStore._flush_lock:
+            with CartStore._lock:
+                if username is None:
+                    batch, CartStore._pending = CartStore._pending, {}
+                else:
+                    batch = {}
+                    if username in CartStore._pending:
+                        batch[username] = CartStore._pending.pop(username)
+                if not CartStore._pending:
+                    CartStore._deadline = None
+            if not batch:
+                return True
+            failed = CartStore._write(batch)
+            if failed:
+                CartStore._requeue(failed)
+                return False
+            return True
+
+    @staticmethod
+    def _write(batch):
+        """Write a batch, one transaction per shard; return the carts that failed."""
+        failed = {}
+        try:
+            shards = {}
+            for user, pending in batch.items():
+                shards.setdefault(ShardRouter.shard_for(user), {})[user] = pending
+        except Exception:
+            logger.exception("Cart flush failed; %d cart(s) will be retried", len(batch))
+            return batch
+        for shard, shard_batch in shards.items():
+            try:
+                CartStore._write_shard(shard, shard_batch)
+            except Exception:
+                logger.exception("Cart flush failed; %d cart(s) will be retried", len(shard_batch))
+                failed.update(shard_batch)
+        return failed
+
+    @staticmethod
+    def _write_shard(shard, batch):
+        cleared = [user for user, pending in batch.items() if pending.clear]
+        removed = [(user, med_id) for user, pending in batch.items()
+                   for med_id, qty in pending.lines.items() if qty <= 0]
+        upserts = [(user, med_id, qty) for user, pending in batch.items()
+                   for med_id, qty in pending.lines.items() if qty > 0]
+        with UnitOfWork(shard) as uow:
+            if cleared:
+                placeholders = ", ".join(["%s"] * len(cleared))
+                uow.execute(f"DELETE FROM cart WHERE user IN ({placeholders})", cleared)
+            if removed:
+                pairs = ", ".join(["(%s, %s)"] * len(removed))
+                uow.execute(
+                    f"DELETE FROM cart WHERE (user, medicine_id) IN ({pairs})",
+                    [value for pair in removed for value in pair]
+                )
+            if upserts:
+                uow.executemany("""
+                    INSERT INTO cart (user, medicine_id, quantity) VALUES (%s, %s, %s)
+                    ON DUPLICATE KEY UPDATE quantity = VALUES(quantity)
+                """, upserts, batch_size=User.SYNC_BATCH_SIZE)
+
+    @staticmethod
+    def _requeue(batch):
+        # Changes made while the failed write was in flight take precedence
+        with CartStore._lock:
+            for user, failed in batch.items():
+                newer = CartStore._pending.get(user)
+                if newer is None:
+                    CartStore._pending[user] = failed
+                elif not newer.clear:
+                    failed.lines.update(newer.lines)
+                    CartStore._pending[user] = failed
+            CartStore._schedule()
+
+    @staticmethod
+    def _pending_for(username):
+        pending = CartStore._pending.get(username)
+        if pending is None:
+            pending = CartStore._pending[username] = _PendingCart()
+        return pending
+
+    @staticmethod
+    def _schedule():
+        # Caller holds _lock. The deadline is set by the oldest unwritten
+        # change, so a busy cart cannot postpone its write indefinitely.
+        if CartStore._deadline is None:
+            CartStore._deadline = time.monotonic() + CartStore.FLUSH_DELAY
+        if CartStore._thread is None:
+            CartStore._thread = threading.Thread(
+                target=CartStore._run, name="cart-flusher", daemon=True
+            )
+            CartStore._thread.start()
+            atexit.register(CartStore.flush)
+        CartStore._wakeup.notify()
+
+    @staticmethod
+    def _run():
+        while True:
+            with CartStore._lock:
+                while CartStore._deadline is None:
+                    CartStore._wakeup.wait()
+                remaining = CartStore._deadline - time.monotonic()
+                if remaining > 0:
+                    CartStore._wakeup.wait(remaining)
+                    continue
+            # A failed batch is requeued with a fresh deadline, which
+            # doubles as the retry back-off
+            CartStore.flush()
 
 # -------------------------------
 # 💬 Consultations
@@ -155,32 +1935,47 @@ class Consultation:
     @staticmethod
     def save(consultation):
         """Save a user consultation request."""
-        with DBConfig.get_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO consultations (user, symptoms, preferred_time, datetime)
-                    VALUES (%s, %s, %s, %s)
-                """, (
-                    consultation['user'],
-                    consultation['symptoms'],
-                    consultation['preferred_time'],
-                    consultation['datetime']
-                ))
+        DBHelper.execute("""
+            INSERT INTO consultations (user, symptoms, preferred_time, datetime)
+            VALUES (%s, %s, %s, %s)
+        """, (
+            consultation['user'],
+            consultation['symptoms'],
+            consultation['preferred_time'],
+            consultation['datetime']
+        ), shard=ShardRouter.shard_for(consultation['user']))
 
     @staticmethod
     def get_user_consultations(username):
         """Get consultations for a single user."""
         return DBHelper.fetch_all(
             "SELECT * FROM consultations WHERE user=%s ORDER BY datetime DESC",
-            (username,)
+            (username,), shard=ShardRouter.shard_for(username)
         )
 
     @staticmethod
     def load_all():
-        """Return all consultations (admin only)."""
-        return DBHelper.fetch_all(
-            "SELECT * FROM consultations ORDER BY datetime DESC"
-        )
+        """Return all consultations (admin only; use iter_all for large tables)."""
+        rows = []
+        for shard in ShardRouter.all_shards():
+            rows += DBHelper.fetch_all(
+                "SELECT * FROM consultations ORDER BY datetime DESC", shard=shard
+            )
+        if ShardRouter.enabled():
+            rows.sort(key=lambda row: row['datetime'], reverse=True)
+        return rows
+
+    @staticmethod
+    def iter_all(chunk_size=None):
+        """Stream every consultation, newest first (per shard), with constant memory."""
+        for shard in ShardRouter.all_shards():
+            for rows in DBHelper.stream(
+                "SELECT * FROM consultations ORDER BY datetime DESC", chunk_size=chunk_size, shard=shard
+            ):
+                if shard is not None:
+                    for row in rows:
+                        row['shard'] = shard
+                yield from rows
 
 # -------------------------------
 # 📬 Validators